@@ -0,0 +1,275 @@
+"""
+Offline benchmark of the full pr_analyses.py pipeline.
+
+For every size, a synthetic repository with that many merged PRs is served by
+fake_github_server.py, and completions come from fake_openai_server.py. The
+real main() then runs against them in a fresh working directory and a
+separate process, so each size starts cold and its memory is measured on
+its own.
+
+    python benchmark.py                         # 100, 1k, 10k and 100k PRs
+    python benchmark.py --sizes 100,1000 --github-latency 0.05 --openai-latency 0.5
+    python benchmark.py --rate-limit-every 50   # every 50th request gets a 429
+
+For each size the benchmark reports:
+- end-to-end wall time;
+- GitHub and OpenAI requests per PR, and how many of them were rate limited;
+- peak resident memory of the pipeline process;
+- throughput in PRs per second.
+
+It also keeps the per-stage timings from the run report. After the first
+size, each subcommand (fetch, analyze, summarize, reflect, run) is run once
+more in the same directory under `python -X importtime`, to measure how long
+its imports take and how quickly it starts. The results are printed as tables
+and written as JSON.
+"""
+import argparse
+import datetime
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import fake_github_server
+import fake_openai_server
+from instrumentation import DEFAULT_REPORT_DIR, write_report
+
+# resource is Unix-only; without it peak memory is not reported
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_SIZES = "100,1000,10000,100000"
+SUBCOMMANDS = ("fetch", "analyze", "summarize", "reflect", "run")
+BENCHMARK_REPO = "bench/synthetic"
+BENCHMARK_USER = "bench-user"
+
+# Client-side budgets are lifted so the benchmark measures the pipeline, not the configured quotas
+UNLIMITED_BUDGET = str(10 ** 9)
+
+
+def peak_rss_mb():
+    """Peak resident memory of this process in MB, or None where it cannot be read."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def run_child(report_path, main_args):
+    """Run pr_analyses.main() in this process and add its peak memory to the run report."""
+    import pr_analyses
+    pr_analyses.main(main_args + ["--report", report_path])
+    with open(report_path, "r", encoding="utf-8") as f:
+        report = json.load(f)
+    report["peak_rss_mb"] = peak_rss_mb()
+    write_report(report, report_path)
+
+
+def import_seconds(stderr):
+    """Total import time reported by python -X importtime, summed over the top-level imports."""
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        # Nested imports are indented in the last column and already counted in their parent's cumulative time
+        if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2][1:].startswith(" "):
+            total_us += int(fields[1])
+    return round(total_us / 1e6, 3)
+
+
+def time_subcommands(run_dir, env):
+    """Run each pr_analyses.py subcommand once under -X importtime and return its import and wall time."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pr_analyses.py")
+    timings = {}
+    for subcommand in SUBCOMMANDS:
+        command = [sys.executable, "-X", "importtime", script, subcommand, "--authors", BENCHMARK_USER,
+                   "--report", os.path.join(run_dir, f"subcommand_{subcommand}_report.json")]
+        started = time.monotonic()
+        completed = subprocess.run(command, cwd=run_dir, env=env, stdout=subprocess.DEVNULL,
+                                   stderr=subprocess.PIPE, universal_newlines=True)
+        timings[subcommand] = {
+            "import_seconds": import_seconds(completed.stderr),
+            "wall_seconds": round(time.monotonic() - started, 3),
+            "exit_status": completed.returncode,
+        }
+    return timings
+
+
+def start_server(server):
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return "http://%s:%d" % server.server_address[:2]
+
+
+def benchmark_size(size, args, workdir, subcommands=False):
+    """
+    Run the pipeline once against a synthetic repository of size PRs and
+    return its measurements; with subcommands, also time each subcommand.
+    """
+    print(f"\n=== {size} PRs ===")
+    started = time.monotonic()
+    repository = fake_github_server.SyntheticRepository(
+        BENCHMARK_REPO, size, user=BENCHMARK_USER, team_size=args.team_size,
+        reviews_per_pr=args.reviews_per_pr, body_chars=args.body_chars
+    )
+    print(f"Generated {size} synthetic PRs in {time.monotonic() - started:.1f}s")
+    github = fake_github_server.make_server([repository], port=0, latency=args.github_latency,
+                                            rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    openai = fake_openai_server.make_server(port=0, latency=args.openai_latency,
+                                            rate_limit_every=args.rate_limit_every, retry_after=args.retry_after)
+    github_url = start_server(github)
+    openai_url = start_server(openai)
+
+    run_dir = os.path.join(workdir, f"prs_{size}")
+    os.makedirs(run_dir, exist_ok=True)
+    report_path = os.path.join(run_dir, "run_report.json")
+    env = dict(
+        os.environ,
+        GITHUB_TOKEN="benchmark",
+        GITHUB_GRAPHQL_URL=f"{github_url}/graphql",
+        GITHUB_GRAPHQL_REPLAY="",
+        GITHUB_GRAPHQL_RECORD="",
+        GITHUB_REPO_NAMES=BENCHMARK_REPO,
+        GITHUB_REQUESTS_PER_MINUTE=UNLIMITED_BUDGET,
+        OPENAI_API_KEY="benchmark",
+        OPENAI_API_BASE=f"{openai_url}/v1",
+        OPENAI_REQUESTS_PER_MINUTE=UNLIMITED_BUDGET,
+        OPENAI_TOKENS_PER_MINUTE=UNLIMITED_BUDGET,
+        OPENAI_BATCH_POLL_SECONDS="0.2",
+        PYTHONUNBUFFERED="1",
+    )
+    command = [sys.executable, os.path.abspath(__file__), "--child-report", report_path,
+               "--"] + args.main_args + ["--authors", BENCHMARK_USER]
+    log_path = os.path.join(run_dir, "run.log")
+    started = time.monotonic()
+    try:
+        with open(log_path, "w", encoding="utf-8") as log:
+            returncode = subprocess.call(command, cwd=run_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        wall_seconds = time.monotonic() - started
+        github_requests, openai_requests = github.state.requests, openai.state.requests
+        rate_limited = github.state.rate_limited + openai.state.rate_limited
+        subcommand_timings = time_subcommands(run_dir, env) if subcommands else None
+    finally:
+        github.shutdown()
+        openai.shutdown()
+        github.server_close()
+        openai.server_close()
+
+    report = {}
+    if returncode == 0 and os.path.exists(report_path):
+        with open(report_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+    else:
+        print(f"Pipeline exited with status {returncode}; see {log_path}")
+
+    results = report.get("results") or []
+    analyzed = sum(result.get("authored", 0) + result.get("reviewed", 0) for result in results)
+    api_calls = github_requests + openai_requests
+    measurement = {
+        "prs": size,
+        "analyzed_prs": analyzed,
+        "exit_status": returncode,
+        "wall_seconds": round(wall_seconds, 2),
+        "prs_per_second": round(size / wall_seconds, 1) if wall_seconds else None,
+        "github_requests": github_requests,
+        "openai_requests": openai_requests,
+        "rate_limited": rate_limited,
+        "api_calls_per_pr": round(api_calls / size, 3) if size else None,
+        "peak_rss_mb": report.get("peak_rss_mb"),
+        "stages": report.get("stages", {}),
+        "counters": report.get("counters", {}),
+        "log": log_path,
+    }
+    if subcommand_timings:
+        measurement["subcommands"] = subcommand_timings
+    print(f"{size} PRs: {measurement['wall_seconds']}s, {measurement['prs_per_second']} PRs/s, "
+          f"{measurement['api_calls_per_pr']} API calls per PR, peak {measurement['peak_rss_mb']} MB")
+    return measurement
+
+
+def print_table(measurements):
+    print("\nBenchmark results:")
+    header = f"{'PRs':>8} {'analyzed':>9} {'wall s':>9} {'PRs/s':>8} {'GitHub':>8} {'OpenAI':>8} {'calls/PR':>9} {'429s':>6} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for m in measurements:
+        print(f"{m['prs']:>8} {m['analyzed_prs']:>9} {m['wall_seconds']:>9} {str(m['prs_per_second']):>8} "
+              f"{m['github_requests']:>8} {m['openai_requests']:>8} {str(m['api_calls_per_pr']):>9} "
+              f"{m['rate_limited']:>6} {str(m['peak_rss_mb']):>8}")
+
+
+def print_subcommand_table(measurement):
+    print(f"\nSubcommand start-up ({measurement['prs']} PRs already stored):")
+    header = f"{'command':>10} {'import s':>9} {'wall s':>9} {'status':>7}"
+    print(header)
+    print("-" * len(header))
+    for subcommand, timing in measurement["subcommands"].items():
+        print(f"{subcommand:>10} {timing['import_seconds']:>9} {timing['wall_seconds']:>9} {timing['exit_status']:>7}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark pr_analyses.py offline against fake GitHub and OpenAI servers.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES,
+                        help=f"Comma-separated numbers of PRs in the synthetic repository (default: {DEFAULT_SIZES})")
+    parser.add_argument("--team-size", type=int, default=10, help="Authors and reviewers in the synthetic team")
+    parser.add_argument("--reviews-per-pr", type=float, default=3.0, help="Average number of reviews per PR")
+    parser.add_argument("--body-chars", type=int, default=400, help="Length of every PR description")
+    parser.add_argument("--github-latency", type=float, default=0.0, help="Seconds added to every GitHub request")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="Seconds added to every OpenAI request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth GitHub and OpenAI request with a 429 (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--workdir", help="Directory for the runs' outputs (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="Keep the temporary working directory")
+    parser.add_argument("--output",
+                        help="Path of the JSON results (default: a new file in .pr_analyses_cache/reports)")
+    parser.add_argument("--child-report", help=argparse.SUPPRESS)
+    parser.add_argument("main_args", nargs=argparse.REMAINDER,
+                        help="Extra pr_analyses.py arguments, after --")
+    args = parser.parse_args(argv)
+    if args.main_args and args.main_args[0] == "--":
+        args.main_args = args.main_args[1:]
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.child_report:
+        run_child(args.child_report, args.main_args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    workdir = args.workdir or tempfile.mkdtemp(prefix="pr_analyses_benchmark_")
+    measurements = []
+    try:
+        for index, size in enumerate(sizes):
+            measurements.append(benchmark_size(size, args, workdir, subcommands=index == 0))
+    finally:
+        if not args.workdir and not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+    print_table(measurements)
+    if measurements and "subcommands" in measurements[0]:
+        print_subcommand_table(measurements[0])
+
+    output = args.output or os.path.join(
+        DEFAULT_REPORT_DIR, f"benchmark_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+    write_report({
+        "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "settings": {key: value for key, value in vars(args).items() if key != "child_report"},
+        "measurements": measurements,
+    }, output)
+    print(f"Benchmark results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
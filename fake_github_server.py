@@ -0,0 +1,246 @@
+"""
+Local stand-in for the GitHub GraphQL API used by pr_analyses.py, serving a
+synthetic repository. It lets the fetch path run offline at any size.
+
+    python fake_github_server.py --port 8088 --prs 10000
+    GITHUB_GRAPHQL_URL=http://127.0.0.1:8088/graphql GITHUB_TOKEN=test python pr_analyses.py
+
+The repository has --prs merged PRs spread evenly over the date range,
+written by a small team that includes --user. Every PR gets on average
+--reviews-per-pr reviews from one or two teammates. Search results follow
+GitHub's rules where they matter to the client: the qualifiers used by
+pr_analyses.py are applied, no more than 1000 results are returned per
+query, and review lists longer than a page are paged separately.
+
+Responses carry X-RateLimit headers. --latency adds a delay to every
+request, and --rate-limit-every N answers every Nth request with a 429 and
+a Retry-After header.
+"""
+import argparse
+import bisect
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# GitHub returns at most this many results for one search query
+SEARCH_RESULT_CAP = 1000
+DEFAULT_START_DATE = datetime.datetime(2024, 9, 1)
+DEFAULT_END_DATE = datetime.datetime(2025, 4, 1)
+
+REVIEW_BODIES = [
+    "LGTM",
+    "Please add a test for the empty input case before merging.",
+    "This allocates on every call; can we hoist it out of the loop?",
+    "Nice cleanup. The error message could name the missing setting.",
+    "Should this be behind the feature flag until the migration lands?",
+]
+
+
+def format_datetime(value):
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_search_date(value):
+    """Parse a search date qualifier value into a naive UTC datetime."""
+    parsed = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+class SyntheticRepository:
+    """Deterministic merged PRs for one repository, ordered by merge time."""
+
+    def __init__(self, name, pr_count, user="bench-user", team_size=10, reviews_per_pr=3.0,
+                 body_chars=400, start_date=DEFAULT_START_DATE, end_date=DEFAULT_END_DATE, seed=0):
+        self.name = name
+        rng = random.Random(seed)
+        team = [user] + [f"dev-{index}" for index in range(1, max(2, team_size))]
+        span_seconds = (end_date - start_date).total_seconds()
+        body = ("Synthetic change description. " * (body_chars // 30 + 1))[:body_chars]
+        self.nodes = []
+        self.merged = []
+        for index in range(pr_count):
+            number = index + 1
+            merged_at = start_date + datetime.timedelta(seconds=int(span_seconds * (index + 0.5) / max(1, pr_count)))
+            author = rng.choice(team)
+            # Reviews come from one or two teammates, as on most real PRs
+            reviewers = rng.sample([login for login in team if login != author], min(2, len(team) - 1))
+            review_count = int(reviews_per_pr) + (1 if rng.random() < reviews_per_pr % 1 else 0)
+            reviews = [{"author": {"login": rng.choice(reviewers)}, "body": rng.choice(REVIEW_BODIES)}
+                       for _ in range(review_count)]
+            self.merged.append(merged_at)
+            self.nodes.append({
+                "number": number,
+                "title": f"Synthetic change {number}",
+                "body": body,
+                "url": f"https://github.com/{name}/pull/{number}",
+                "createdAt": format_datetime(merged_at - datetime.timedelta(days=2)),
+                "updatedAt": format_datetime(merged_at + datetime.timedelta(hours=1)),
+                "mergedAt": format_datetime(merged_at),
+                "merged": True,
+                "changedFiles": rng.randint(1, 30),
+                "additions": rng.randint(1, 800),
+                "deletions": rng.randint(0, 400),
+                "author": {"login": author},
+                "reviews": reviews,
+            })
+        self.by_number = {node["number"]: node for node in self.nodes}
+
+    def search(self, query):
+        """Return the PRs matching a search query, newest first."""
+        start, end = None, None
+        filters = []
+        for term in query.split():
+            negated = term.startswith("-")
+            key, _, value = term.lstrip("-").partition(":")
+            if key == "merged" and ".." in value:
+                start, end = (parse_search_date(part) for part in value.split(".."))
+            elif key == "updated" and value.startswith(">="):
+                since = format_datetime(parse_search_date(value[2:]))
+                filters.append(lambda node, since=since: node["updatedAt"] >= since)
+            elif key == "author":
+                filters.append(lambda node, login=value, negated=negated: (node["author"]["login"] == login) != negated)
+            elif key == "reviewed-by":
+                filters.append(lambda node, login=value: any(review["author"]["login"] == login for review in node["reviews"]))
+        low = bisect.bisect_left(self.merged, start) if start else 0
+        high = bisect.bisect_right(self.merged, end) if end else len(self.merged)
+        matches = [node for node in self.nodes[low:high] if all(check(node) for check in filters)]
+        matches.reverse()
+        return matches
+
+
+def review_page(reviews, first, after=None):
+    offset = int(after or 0)
+    return {
+        "pageInfo": {"hasNextPage": offset + first < len(reviews), "endCursor": str(offset + first)},
+        "nodes": reviews[offset:offset + first],
+    }
+
+
+class FakeGitHubState:
+    """Synthetic repositories and request counters, shared by all request handlers."""
+
+    def __init__(self, repositories, latency=0.0, rate_limit_every=0, retry_after=1, rate_limit=1000000):
+        self.repositories = {repository.name: repository for repository in repositories}
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.reset = int(time.time()) + 3600
+        self.requests = 0
+        self.rate_limited = 0
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        """Count a request and return True when it should be answered with a 429."""
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+        return False
+
+    def rate_limit_headers(self):
+        with self.lock:
+            if time.time() >= self.reset:
+                self.reset = int(time.time()) + 3600
+            remaining = max(0, self.rate_limit - self.requests)
+        return {
+            "X-RateLimit-Limit": str(self.rate_limit),
+            "X-RateLimit-Remaining": str(remaining),
+            "X-RateLimit-Reset": str(self.reset),
+            "X-RateLimit-Resource": "graphql",
+        }
+
+    def execute(self, query, variables):
+        if "search(" in query:
+            repository = None
+            for term in variables["searchQuery"].split():
+                if term.startswith("repo:"):
+                    repository = self.repositories.get(term[len("repo:"):])
+            matches = repository.search(variables["searchQuery"]) if repository else []
+            offset = int(variables.get("cursor") or 0)
+            end = min(offset + variables["pageSize"], len(matches), SEARCH_RESULT_CAP)
+            nodes = [dict(node, reviews=review_page(node["reviews"], variables["reviewPageSize"]))
+                     for node in matches[offset:end]]
+            return {"data": {"search": {
+                "issueCount": len(matches),
+                "pageInfo": {"hasNextPage": end < min(len(matches), SEARCH_RESULT_CAP), "endCursor": str(end)},
+                "nodes": nodes,
+            }}}
+        if "pullRequest(" in query:
+            repository = self.repositories.get(f"{variables['owner']}/{variables['name']}")
+            node = repository.by_number.get(variables["number"]) if repository else None
+            if node is None:
+                return {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND", "message": "Could not resolve to a PullRequest"}]}
+            reviews = review_page(node["reviews"], variables["reviewPageSize"], variables.get("cursor"))
+            return {"data": {"repository": {"pullRequest": {"reviews": reviews}}}}
+        return {"errors": [{"message": "Unsupported query"}]}
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        return
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if not self.path.rstrip("/").endswith("/graphql"):
+            return self._send_json({"message": "Not Found"}, status=404)
+        headers = self.state.rate_limit_headers()
+        if self.state.count_request():
+            headers["Retry-After"] = str(self.state.retry_after)
+            return self._send_json({"message": "You have exceeded a secondary rate limit."}, status=429, headers=headers)
+        request = json.loads(body)
+        self._send_json(self.state.execute(request["query"], request.get("variables") or {}), headers=headers)
+
+
+def make_server(repositories, host="127.0.0.1", port=8088, latency=0.0, rate_limit_every=0, retry_after=1):
+    """Create (but do not start) a stand-in server; port 0 picks a free port."""
+    state = FakeGitHubState(repositories, latency, rate_limit_every, retry_after)
+    handler = type("Handler", (FakeGitHubHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the GitHub GraphQL API with a synthetic repository.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8088)
+    parser.add_argument("--repo", default="bench/synthetic", help="Name of the synthetic repository")
+    parser.add_argument("--prs", type=int, default=1000, help="Number of merged PRs in the repository")
+    parser.add_argument("--user", default="bench-user", help="Team member to analyze")
+    parser.add_argument("--team-size", type=int, default=10)
+    parser.add_argument("--reviews-per-pr", type=float, default=3.0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth request with a 429 (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+    repository = SyntheticRepository(args.repo, args.prs, user=args.user, team_size=args.team_size,
+                                     reviews_per_pr=args.reviews_per_pr)
+    server = make_server([repository], args.host, args.port, args.latency, args.rate_limit_every, args.retry_after)
+    print(f"Fake GitHub GraphQL API listening on http://{args.host}:{server.server_address[1]}/graphql")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
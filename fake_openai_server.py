@@ -0,0 +1,227 @@
+"""
+Local stand-in for the parts of the OpenAI API used by pr_analyses.py:
+chat completions, file uploads and the Batch API. It lets batch mode and
+the rest of the pipeline run offline.
+
+    python fake_openai_server.py --port 8089
+    OPENAI_API_BASE=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test python pr_analyses.py --batch
+
+Completions are canned text derived from the prompt. A batch reports
+in_progress for --batch-polls polls and then completes. --rate-limit-every N
+answers every Nth chat request with a 429 and a Retry-After header.
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_ids = itertools.count(1)
+
+
+def new_id(prefix):
+    return f"{prefix}-{next(_ids)}"
+
+
+def completion_text(messages):
+    """Deterministic stand-in answer for a chat request."""
+    prompt = messages[-1]["content"] if messages else ""
+    for line in prompt.splitlines():
+        if line.startswith("PR URL:"):
+            url = line.split(":", 1)[1].strip()
+            return f"I shipped this {url}, which did the following:\n- Stand-in analysis ({len(prompt)} prompt characters)"
+    return f"Stand-in summary of {len(prompt)} prompt characters."
+
+
+def chat_completion(body):
+    messages = body.get("messages", [])
+    text = completion_text(messages)
+    prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4 + 1
+    completion_tokens = len(text) // 4 + 1
+    return {
+        "id": new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "gpt-4o"),
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                  "total_tokens": prompt_tokens + completion_tokens},
+    }
+
+
+class FakeOpenAIState:
+    """Uploaded files and batches, shared by all request handlers."""
+
+    def __init__(self, batch_polls=2, latency=0.0, rate_limit_every=0, retry_after=1):
+        self.batch_polls = batch_polls
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.requests = 0
+        self.rate_limited = 0
+        self.files = {}
+        self.batches = {}
+        self.polls = {}
+        self.lock = threading.Lock()
+
+    def count_request(self):
+        """Count a chat request and return True when it should be answered with a 429."""
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit_every and self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+        return False
+
+    def add_file(self, filename, content, purpose):
+        file_id = new_id("file")
+        with self.lock:
+            self.files[file_id] = {
+                "id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()),
+                "filename": filename, "purpose": purpose, "status": "processed", "content": content,
+            }
+        return self.file_info(file_id)
+
+    def file_info(self, file_id):
+        return {key: value for key, value in self.files[file_id].items() if key != "content"}
+
+    def create_batch(self, body):
+        batch_id = new_id("batch")
+        lines = [line for line in self.files[body["input_file_id"]]["content"].decode("utf-8").splitlines() if line.strip()]
+        batch = {
+            "id": batch_id, "object": "batch", "endpoint": body["endpoint"], "input_file_id": body["input_file_id"],
+            "completion_window": body["completion_window"], "status": "validating", "created_at": int(time.time()),
+            "output_file_id": None, "error_file_id": None, "metadata": body.get("metadata"),
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        with self.lock:
+            self.batches[batch_id] = batch
+            self.polls[batch_id] = 0
+        return batch
+
+    def poll_batch(self, batch_id):
+        with self.lock:
+            batch = self.batches[batch_id]
+            if batch["status"] in ("completed", "failed", "expired", "cancelled"):
+                return batch
+            self.polls[batch_id] += 1
+            if self.polls[batch_id] <= self.batch_polls:
+                batch["status"] = "in_progress"
+                return batch
+        self._complete_batch(batch)
+        return batch
+
+    def _complete_batch(self, batch):
+        output = []
+        content = self.files[batch["input_file_id"]]["content"].decode("utf-8")
+        for line in content.splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            output.append(json.dumps({
+                "id": new_id("batch_req"),
+                "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": new_id("req"), "body": chat_completion(request["body"])},
+                "error": None,
+            }))
+        output_file = self.add_file("batch_output.jsonl", ("\n".join(output) + "\n").encode("utf-8"), "batch_output")
+        with self.lock:
+            batch["output_file_id"] = output_file["id"]
+            batch["request_counts"]["completed"] = len(output)
+            batch["status"] = "completed"
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        return
+
+    def _send_json(self, payload, status=200, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+    def do_POST(self):
+        body = self._read_body()
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.path.endswith("/chat/completions"):
+            if self.state.count_request():
+                return self._send_json({"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                                       status=429, headers={"Retry-After": str(self.state.retry_after)})
+            return self._send_json(chat_completion(json.loads(body)))
+        if self.path.endswith("/files"):
+            message = BytesParser(policy=default_policy).parsebytes(
+                b"Content-Type: " + self.headers["Content-Type"].encode("latin-1") + b"\r\n\r\n" + body
+            )
+            fields = {}
+            for part in message.iter_parts():
+                name = part.get_param("name", header="content-disposition")
+                fields[name] = (part.get_filename(), part.get_payload(decode=True))
+            filename, content = fields["file"]
+            purpose = fields.get("purpose", (None, b"batch"))[1].decode("utf-8")
+            return self._send_json(self.state.add_file(filename, content, purpose))
+        if self.path.endswith("/batches"):
+            return self._send_json(self.state.create_batch(json.loads(body)))
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def do_GET(self):
+        parts = self.path.split("?")[0].rstrip("/").split("/")
+        try:
+            if parts[-2] == "batches":
+                return self._send_json(self.state.poll_batch(parts[-1]))
+            if parts[-1] == "content" and parts[-3] == "files":
+                content = self.state.files[parts[-2]]["content"]
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+                return
+            if parts[-2] == "files":
+                return self._send_json(self.state.file_info(parts[-1]))
+        except (KeyError, IndexError):
+            pass
+        self._send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+
+def make_server(host="127.0.0.1", port=8089, batch_polls=2, latency=0.0, rate_limit_every=0, retry_after=1):
+    """Create (but do not start) a stand-in server; port 0 picks a free port."""
+    state = FakeOpenAIState(batch_polls, latency, rate_limit_every, retry_after)
+    handler = type("Handler", (FakeOpenAIHandler,), {"state": state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.state = state
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI chat, files and batch APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--batch-polls", type=int, default=2,
+                        help="Number of polls a batch stays in progress before completing")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="Seconds added to every POST request")
+    parser.add_argument("--rate-limit-every", type=int, default=0,
+                        help="Answer every Nth chat request with a 429 (0 disables)")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, args.batch_polls, args.latency, args.rate_limit_every, args.retry_after)
+    print(f"Fake OpenAI API listening on http://{args.host}:{server.server_address[1]}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
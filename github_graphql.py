@@ -0,0 +1,243 @@
+"""
+Batched GitHub GraphQL access for PR metadata and reviews.
+
+One search query returns a page of PRs together with their stats and review
+authors/bodies, replacing the per-PR REST round trips PyGithub makes for
+reviews and lazily completed attributes.
+
+Transports are callables taking (query, variables) and returning the decoded
+JSON response. RecordedTransport records live responses to a JSON file and
+replays them, so the fetch layer can be exercised offline.
+"""
+import hashlib
+import json
+import os
+import threading
+
+from instrumentation import increment, span
+from rate_limit import PRIORITY_DETAIL, PRIORITY_LISTING, call_with_backoff
+
+GITHUB_GRAPHQL_URL = "https://api.github.com/graphql"
+
+# Review connections are fetched with the PR; longer review lists are paged separately
+REVIEW_PAGE_SIZE = 50
+
+PULL_REQUEST_FIELDS = """
+    number
+    title
+    body
+    url
+    createdAt
+    updatedAt
+    mergedAt
+    merged
+    changedFiles
+    additions
+    deletions
+    author { login }
+    reviews(first: $reviewPageSize) {
+      pageInfo { hasNextPage endCursor }
+      nodes { author { login } body }
+    }
+"""
+
+PULL_REQUEST_SEARCH_QUERY = """
+query($searchQuery: String!, $pageSize: Int!, $cursor: String, $reviewPageSize: Int!) {
+  search(query: $searchQuery, type: ISSUE, first: $pageSize, after: $cursor) {
+    issueCount
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      ... on PullRequest {%s}
+    }
+  }
+}
+""" % PULL_REQUEST_FIELDS
+
+PULL_REQUEST_REVIEWS_QUERY = """
+query($owner: String!, $name: String!, $number: Int!, $reviewPageSize: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $number) {
+      reviews(first: $reviewPageSize, after: $cursor) {
+        pageInfo { hasNextPage endCursor }
+        nodes { author { login } body }
+      }
+    }
+  }
+}
+"""
+
+
+class GraphQLError(Exception):
+    """Raised when the GraphQL endpoint returns errors instead of data."""
+
+    def __init__(self, message, rate_limited=False):
+        super().__init__(message)
+        self.rate_limited = rate_limited
+
+
+class HTTPTransport:
+    """
+    Sends GraphQL queries to GitHub over HTTPS. on_headers, if given, is
+    called with the headers and status of every response, such as a rate
+    limit scheduler's observe().
+    """
+
+    def __init__(self, token, url=GITHUB_GRAPHQL_URL, timeout=60, on_headers=None):
+        # Imported here so replaying recordings does not load requests
+        import requests
+        
+        self.url = url
+        self.timeout = timeout
+        self.on_headers = on_headers
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"bearer {token}",
+            "Content-Type": "application/json",
+        })
+
+    def __call__(self, query, variables):
+        response = self.session.post(
+            self.url,
+            data=json.dumps({"query": query, "variables": variables}),
+            timeout=self.timeout,
+        )
+        increment("github.graphql.bytes", len(response.content))
+        if self.on_headers:
+            self.on_headers(response.headers, response.status_code)
+        response.raise_for_status()
+        return response.json()
+
+
+def request_key(query, variables):
+    """Stable key for a GraphQL request, used to look up recorded responses."""
+    payload = json.dumps({"query": " ".join(query.split()), "variables": variables}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RecordedTransport:
+    """
+    Replays GraphQL responses recorded in a JSON file.
+
+    When a live transport is given, requests are forwarded to it and the
+    responses are saved to the file; without one, unknown requests raise
+    KeyError so offline runs never touch the network.
+    """
+
+    def __init__(self, path, live_transport=None):
+        self.path = path
+        self.live_transport = live_transport
+        self._lock = threading.Lock()
+        self.recordings = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.recordings = json.load(f)
+
+    def __call__(self, query, variables):
+        key = request_key(query, variables)
+        with self._lock:
+            if key in self.recordings:
+                return self.recordings[key]["response"]
+        if self.live_transport is None:
+            raise KeyError(f"No recorded GraphQL response for variables {variables}")
+
+        response = self.live_transport(query, variables)
+        with self._lock:
+            self.recordings[key] = {"variables": variables, "response": response}
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.recordings, f, indent=2, sort_keys=True)
+        return response
+
+
+class GraphQLClient:
+    """
+    Executes GraphQL queries through a transport and unwraps the data payload.
+    A rate limiter, if given, is shared with every other user of the client.
+    Rate-limited and failed requests are retried with backoff.
+    """
+
+    def __init__(self, transport, rate_limiter=None):
+        self.transport = transport
+        self.rate_limiter = rate_limiter
+        self.request_count = 0
+        self._lock = threading.Lock()
+
+    def execute(self, query, variables=None, stage="graphql:query", priority=PRIORITY_LISTING):
+        """
+        Run a query and return its data. stage labels the request in the rate
+        limiter's budget summary; priority orders it against other waiting requests.
+        """
+        def attempt():
+            if self.rate_limiter:
+                increment("github.rate_limit_wait_seconds", self.rate_limiter.acquire(priority=priority, stage=stage))
+                with self.rate_limiter.in_flight(), span("github.graphql", stage=stage):
+                    result = self.transport(query, variables or {})
+            else:
+                with span("github.graphql", stage=stage):
+                    result = self.transport(query, variables or {})
+            increment("github.graphql.requests")
+            with self._lock:
+                self.request_count += 1
+            if result.get("errors"):
+                messages = "; ".join(error.get("message", str(error)) for error in result["errors"])
+                rate_limited = any(error.get("type") == "RATE_LIMITED" for error in result["errors"])
+                raise GraphQLError(messages, rate_limited=rate_limited)
+            return result["data"]
+
+        def log_retry(error, attempt_number, delay):
+            response = getattr(error, "response", None)
+            observe = getattr(self.rate_limiter, "observe", None)
+            if observe and response is not None:
+                observe(response.headers, response.status_code, stage)
+            increment("github.retries")
+            increment("github.retry_sleep_seconds", delay)
+            print(f"GitHub GraphQL request failed ({error}); retry {attempt_number} in {delay:.1f}s")
+
+        return call_with_backoff(attempt, on_retry=log_retry)
+
+
+def _complete_reviews(client, repo_name, node, on_request=None):
+    """Page through the remaining reviews of a PR whose review list did not fit in the search page."""
+    reviews = node["reviews"]
+    owner, name = repo_name.split("/", 1)
+    while reviews["pageInfo"]["hasNextPage"]:
+        if on_request:
+            on_request("graphql:reviews")
+        data = client.execute(PULL_REQUEST_REVIEWS_QUERY, {
+            "owner": owner,
+            "name": name,
+            "number": node["number"],
+            "reviewPageSize": REVIEW_PAGE_SIZE,
+            "cursor": reviews["pageInfo"]["endCursor"],
+        }, stage="graphql:reviews", priority=PRIORITY_DETAIL)
+        page = data["repository"]["pullRequest"]["reviews"]
+        reviews["nodes"].extend(page["nodes"])
+        reviews["pageInfo"] = page["pageInfo"]
+
+
+def search_pull_requests(client, repo_name, search_query, page_size=50, on_request=None):
+    """
+    Yield pages of PR nodes matching a search query, one GraphQL request per
+    page. Each page is a tuple of (issue_count, nodes). on_request, if given,
+    is called with the stage of every request made, including the extra
+    review pages of PRs with long review lists.
+    """
+    cursor = None
+    while True:
+        if on_request:
+            on_request("graphql:search")
+        data = client.execute(PULL_REQUEST_SEARCH_QUERY, {
+            "searchQuery": search_query,
+            "pageSize": page_size,
+            "cursor": cursor,
+            "reviewPageSize": REVIEW_PAGE_SIZE,
+        }, stage="graphql:search")
+        search = data["search"]
+        # Non-PR search hits come back as empty objects
+        nodes = [node for node in search["nodes"] if node]
+        for node in nodes:
+            _complete_reviews(client, repo_name, node, on_request)
+        yield search["issueCount"], nodes
+
+        if not search["pageInfo"]["hasNextPage"]:
+            break
+        cursor = search["pageInfo"]["endCursor"]
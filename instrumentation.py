@@ -0,0 +1,179 @@
+"""
+Run instrumentation: wall time per stage and per PR, plus counters for
+HTTP requests and bytes, LLM tokens, cache hits, retries and rate-limit
+sleeps. Everything is collected in one process-wide RunMetrics and written
+out as a JSON run report at the end of a run.
+
+When the opentelemetry package is installed, every span() is also emitted
+as an OpenTelemetry span through the globally configured tracer provider.
+"""
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# OpenTelemetry is optional; without it spans are only aggregated into the report
+try:
+    from opentelemetry import trace
+    OPENTELEMETRY_AVAILABLE = True
+except ImportError:
+    OPENTELEMETRY_AVAILABLE = False
+
+DEFAULT_REPORT_DIR = os.path.join(".pr_analyses_cache", "reports")
+
+
+class RunMetrics:
+    """Thread-safe stage timings and counters for one run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = datetime.datetime.now(datetime.timezone.utc)
+        self._started = time.monotonic()
+        self.stages = {}
+        self.counters = {}
+        self.prs = {}
+        self._tracer = trace.get_tracer("pr_analyses") if OPENTELEMETRY_AVAILABLE else None
+
+    def increment(self, name, amount=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_error(self, name):
+        with self._lock:
+            self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})["errors"] += 1
+
+    def record(self, name, seconds, pr=None):
+        """Add one timed occurrence of a stage, and to the PR's timings when pr is given."""
+        with self._lock:
+            stage = self.stages.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "errors": 0})
+            stage["count"] += 1
+            stage["seconds"] += seconds
+            stage["max_seconds"] = max(stage["max_seconds"], seconds)
+            if pr is not None:
+                timings = self.prs.setdefault(pr, {})
+                timings[name] = timings.get(name, 0.0) + seconds
+
+    @contextmanager
+    def span(self, name, pr=None, **attributes):
+        """
+        Time a stage. pr (a PR URL) also records the time against that PR;
+        other attributes are only passed on to OpenTelemetry.
+        """
+        started = time.monotonic()
+        otel_span = None
+        if self._tracer:
+            span_attributes = dict(attributes, pr=pr) if pr else attributes
+            otel_span = self._tracer.start_as_current_span(name, attributes=span_attributes)
+            otel_span.__enter__()
+        try:
+            yield
+        except BaseException as e:
+            self.record_error(name)
+            if otel_span:
+                otel_span.__exit__(type(e), e, e.__traceback__)
+                otel_span = None
+            raise
+        finally:
+            self.record(name, time.monotonic() - started, pr=pr)
+            if otel_span:
+                otel_span.__exit__(None, None, None)
+
+    def report(self, **extra):
+        """Return the run report as a JSON-serializable dict; extra keys are added as given."""
+        with self._lock:
+            report = {
+                "started_at": self.started_at.isoformat(),
+                "finished_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+                "wall_seconds": round(time.monotonic() - self._started, 3),
+                "stages": {name: dict(stage, seconds=round(stage["seconds"], 3), max_seconds=round(stage["max_seconds"], 3))
+                           for name, stage in sorted(self.stages.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "prs": {pr: {name: round(seconds, 3) for name, seconds in timings.items()}
+                        for pr, timings in self.prs.items()},
+            }
+        report.update(extra)
+        return report
+
+    def summary(self):
+        """Short per-stage timing table for the console."""
+        lines = ["Time by stage:"]
+        with self._lock:
+            for name, stage in sorted(self.stages.items(), key=lambda item: -item[1]["seconds"]):
+                lines.append(f"- {name}: {stage['seconds']:.1f}s over {stage['count']} calls")
+        return "\n".join(lines)
+
+
+_metrics = RunMetrics()
+
+
+def get_metrics():
+    """Return the metrics of the current run."""
+    return _metrics
+
+
+def start_run_metrics():
+    """Start collecting metrics for a new run, discarding the previous run's."""
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+
+def span(name, pr=None, **attributes):
+    return _metrics.span(name, pr=pr, **attributes)
+
+
+def increment(name, amount=1):
+    _metrics.increment(name, amount)
+
+
+def timed(name):
+    """Decorator recording every call of a function as a span called name."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_iter(name, iterable):
+    """
+    Yield the items of iterable, recording the time spent producing them as
+    one occurrence of stage name. The caller's time between items is not
+    counted, so a streaming stage such as a scan is timed on its own. It is
+    only aggregated into the report, not emitted as an OpenTelemetry span.
+    """
+    metrics = _metrics
+    iterator = iter(iterable)
+    seconds = 0.0
+    try:
+        while True:
+            started = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except BaseException:
+                metrics.record_error(name)
+                raise
+            finally:
+                seconds += time.monotonic() - started
+            yield item
+    finally:
+        metrics.record(name, seconds)
+
+
+def write_report(report, path):
+    """Write a run report as JSON, replacing any existing file atomically."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+    return path
@@ -0,0 +1,175 @@
+"""
+Bulk chat completions through the OpenAI Batch API.
+
+Requests are written to a JSONL file, uploaded, and submitted as one batch.
+The batch is then polled until it finishes. The batch id is kept in a small
+JSON state file while the batch runs. If the process restarts while polling,
+the next run picks the same batch up again instead of submitting (and paying
+for) the requests twice.
+
+Each request's custom_id is its response cache key, so results map straight
+back to the cache and to the PRs that asked for them.
+"""
+import io
+import json
+import os
+import time
+
+from instrumentation import increment
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+DEFAULT_POLL_INTERVAL = 30
+
+# Batch statuses after which polling stops
+FINISHED_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_request_line(custom_id, model, system_message, prompt):
+    """One JSONL line of a chat completions batch."""
+    return json.dumps({
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+        },
+    })
+
+
+def load_batch_state(path):
+    """Return the state of a batch left running by an earlier process, or None."""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"Ignoring unreadable batch state {path}: {e}")
+        return None
+
+
+def save_batch_state(path, state):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def submit_batch(client, requests, state_path, metadata=None):
+    """
+    Upload requests ({custom_id: (model, system_message, prompt)}) and create
+    a batch. The batch id and request labels are saved to state_path.
+    """
+    lines = [batch_request_line(custom_id, *request) for custom_id, request in requests.items()]
+    payload = io.BytesIO(("\n".join(lines) + "\n").encode("utf-8"))
+    input_file = client.files.create(file=("batch_input.jsonl", payload), purpose="batch")
+    options = {"metadata": metadata} if metadata else {}
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        **options
+    )
+    save_batch_state(state_path, {
+        "batch_id": batch.id,
+        "input_file_id": input_file.id,
+        "custom_ids": list(requests),
+        "metadata": metadata or {},
+    })
+    print(f"Submitted batch {batch.id} with {len(requests)} requests")
+    return batch
+
+
+def wait_for_batch(client, batch_id, poll_interval=DEFAULT_POLL_INTERVAL):
+    """Poll a batch until it reaches a finished status and return it."""
+    last_progress = None
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = getattr(batch, "request_counts", None)
+        progress = (batch.status, getattr(counts, "completed", None), getattr(counts, "failed", None))
+        if progress != last_progress:
+            if counts:
+                print(f"Batch {batch_id}: {batch.status} ({counts.completed} completed, {counts.failed} failed of {counts.total})")
+            else:
+                print(f"Batch {batch_id}: {batch.status}")
+            last_progress = progress
+        if batch.status in FINISHED_STATUSES:
+            return batch
+        time.sleep(poll_interval)
+
+
+def _read_jsonl_file(client, file_id):
+    if not file_id:
+        return []
+    response = client.files.content(file_id)
+    increment("llm.bytes", len(response.content))
+    text = response.text
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def batch_results(client, batch):
+    """
+    Return {custom_id: (content, error)} for a finished batch. Exactly one of
+    content and error is set for every request that produced a result line.
+    """
+    results = {}
+    for line in _read_jsonl_file(client, getattr(batch, "output_file_id", None)):
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or response.get("body", {}).get("error") or f"HTTP {response.get('status_code')}"
+            results[line["custom_id"]] = (None, str(error))
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        results[line["custom_id"]] = (content, None)
+    for line in _read_jsonl_file(client, getattr(batch, "error_file_id", None)):
+        error = line.get("error") or (line.get("response") or {}).get("body", {}).get("error")
+        results.setdefault(line["custom_id"], (None, str(error)))
+    return results
+
+
+def run_batch(client, requests, state_path, poll_interval=DEFAULT_POLL_INTERVAL, metadata=None, on_results=None):
+    """
+    Complete requests ({custom_id: (model, system_message, prompt)}) as
+    batches and return {custom_id: (content, error)}.
+
+    A batch recorded in state_path is resumed first and its results are kept
+    for any custom_id still requested. Only the remaining requests are
+    submitted in a new batch. The results of each batch are passed to
+    on_results before its state file is removed, so a crash in between
+    resumes the batch instead of losing the results.
+    """
+    results = {}
+    state = load_batch_state(state_path)
+    if state:
+        print(f"Resuming batch {state['batch_id']} from {state_path}")
+        batch = wait_for_batch(client, state["batch_id"], poll_interval)
+        resumed = {custom_id: result for custom_id, result in batch_results(client, batch).items()
+                   if custom_id in requests}
+        if on_results:
+            on_results(resumed)
+        results.update(resumed)
+        os.remove(state_path)
+
+    remaining = {custom_id: request for custom_id, request in requests.items() if custom_id not in results}
+    if remaining:
+        batch = submit_batch(client, remaining, state_path, metadata=metadata)
+        batch = wait_for_batch(client, batch.id, poll_interval)
+        if batch.status != "completed":
+            print(f"Batch {batch.id} finished with status {batch.status}")
+        submitted = batch_results(client, batch)
+        if on_results:
+            on_results(submitted)
+        results.update(submitted)
+        os.remove(state_path)
+
+    for custom_id in requests:
+        results.setdefault(custom_id, (None, "no result returned by the batch"))
+    return results
@@ -0,0 +1,81 @@
+"""
+Bounded producer/consumer pipeline.
+
+A producer thread pulls items from an iterator into a bounded queue, worker
+threads process them, and results are handed back to the calling thread as
+they complete. When workers fall behind, the full queue blocks the producer,
+so memory stays bounded by the queue size rather than the number of items.
+"""
+import queue
+import threading
+
+_DONE = object()
+
+
+def run_pipeline(items, process, handle, workers=4, queue_size=None):
+    """
+    Run process(item) for every item on `workers` threads and call
+    handle(seq, item, result) on the calling thread as each result completes.
+    `seq` is the item's position in the input. Exceptions raised by the
+    producer or a worker are re-raised once in-flight items have drained.
+    """
+    queue_size = queue_size or workers * 2
+    inbox = queue.Queue(maxsize=queue_size)
+    outbox = queue.Queue(maxsize=queue_size)
+    errors = []
+    stop = threading.Event()
+
+    def produce():
+        try:
+            for seq, item in enumerate(items):
+                if stop.is_set():
+                    break
+                inbox.put((seq, item))
+        except Exception as e:
+            errors.append(e)
+        finally:
+            for _ in range(workers):
+                inbox.put(_DONE)
+
+    def work():
+        try:
+            while True:
+                entry = inbox.get()
+                if entry is _DONE:
+                    break
+                seq, item = entry
+                # After a failure, drain the queue without doing more work
+                if stop.is_set():
+                    continue
+                try:
+                    result = process(item)
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                    continue
+                outbox.put((seq, item, result))
+        finally:
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=produce, daemon=True)]
+    threads += [threading.Thread(target=work, daemon=True) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    finished_workers = 0
+    while finished_workers < workers:
+        entry = outbox.get()
+        if entry is _DONE:
+            finished_workers += 1
+            continue
+        if not stop.is_set():
+            try:
+                handle(*entry)
+            except Exception as e:
+                errors.append(e)
+                stop.set()
+
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
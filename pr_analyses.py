@@ -1,33 +1,56 @@
 import os
+import sys
+import argparse
 import datetime
-from dateutil.relativedelta import relativedelta
-import requests
-from github import Github
-from github.GithubException import GithubException
-from openai import OpenAI
-# Make pandas import optional since we're not using it heavily
-try:
-    import pandas as pd
-    PANDAS_AVAILABLE = True
-except ImportError:
-    PANDAS_AVAILABLE = False
+# Third-party clients (openai, requests, tiktoken) are imported where they are
+# first needed, so subcommands that do not talk to GitHub or OpenAI start without loading them
 from dotenv import load_dotenv
+import itertools
 import json
-import time
+import queue
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from github_graphql import GraphQLClient, HTTPTransport, RecordedTransport, GITHUB_GRAPHQL_URL, search_pull_requests
+from rate_limit import RateLimiter, GitHubRateScheduler, call_with_backoff
+from response_cache import ResponseCache, DEFAULT_CACHE_PATH, cache_key
+from pr_store import PRStore, DEFAULT_STORE_PATH
+from pipeline import run_pipeline
+from openai_batch import run_batch, DEFAULT_POLL_INTERVAL
+from run_journal import RunJournal, DEFAULT_JOURNAL_PATH
+from pr_snapshot import iter_snapshot, read_snapshot_header, write_snapshot
+from instrumentation import DEFAULT_REPORT_DIR, get_metrics, increment, span, start_run_metrics, timed, timed_iter, write_report
 
 # Load environment variables
 load_dotenv()
 
 # Initialize API clients
-def initialize_github_client():
-    """Initialize and return a GitHub client."""
+def initialize_graphql_client(rate_limiter=None):
+    """
+    Initialize and return a GitHub GraphQL client.
+    Set GITHUB_GRAPHQL_REPLAY to a recording file to run offline from recorded
+    responses, or GITHUB_GRAPHQL_RECORD to record live responses to a file.
+    """
+    replay_path = os.getenv("GITHUB_GRAPHQL_REPLAY")
+    if replay_path:
+        return GraphQLClient(RecordedTransport(replay_path), rate_limiter=rate_limiter)
+
     github_token = os.getenv("GITHUB_TOKEN")
     if not github_token:
         raise ValueError("GITHUB_TOKEN not found in environment variables")
-    return Github(github_token)
+    transport = HTTPTransport(github_token, url=os.getenv("GITHUB_GRAPHQL_URL", GITHUB_GRAPHQL_URL),
+                              on_headers=getattr(rate_limiter, 'observe', None))
+
+    record_path = os.getenv("GITHUB_GRAPHQL_RECORD")
+    if record_path:
+        transport = RecordedTransport(record_path, live_transport=transport)
+    return GraphQLClient(transport, rate_limiter=rate_limiter)
 
 def initialize_openai_client():
     """Initialize and return an OpenAI client."""
+    from openai import OpenAI
+    
     openai_api_key = os.getenv("OPENAI_API_KEY")
     openai_api_base = os.getenv("OPENAI_API_BASE")
     
@@ -36,158 +59,477 @@ def initialize_openai_client():
     if not openai_api_base:
         raise ValueError("OPENAI_API_BASE not found in environment variables")
     
-    # Clean, simple initialization
+    # Retries are handled by call_with_backoff so they share the rate limiter
     return OpenAI(
         api_key=openai_api_key,
-        base_url=openai_api_base
+        base_url=openai_api_base,
+        max_retries=0
     )
 
-# PR Fetching
-def fetch_prs(github_client, repo_name, start_date=None, end_date=None, author=None, merged_only=False):
+# LLM request budget, overridable through the environment
+OPENAI_MODEL = "gpt-4o"
+DEFAULT_LLM_CONCURRENCY = 4
+DEFAULT_LLM_REQUESTS_PER_MINUTE = 60
+DEFAULT_LLM_TOKENS_PER_MINUTE = 30000
+# Rough completion size reserved from the token budget before a response arrives
+EXPECTED_COMPLETION_TOKENS = 800
+
+def initialize_llm_rate_limiter():
     """
-    Fetch PRs from the specified repository within a date range.
-    Optionally filter by author username and merged status.
+    Initialize the requests/tokens per minute limiter for OpenAI calls. One
+    limiter is shared by every repository worker, so OPENAI_MAX_CONCURRENCY
+    caps the requests in flight across the whole run.
     """
-    # Default to last 6 months if no dates specified
-    if not end_date:
-        end_date = datetime.datetime.now()
-    if not start_date:
-        start_date = end_date - relativedelta(months=6)
-        
-    print(f"Fetching PRs from {repo_name} between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}...")
-    if author:
-        print(f"Filtering for PRs authored by: {author}")
-    if merged_only:
-        print("Filtering for merged PRs only")
-    
-    try:
-        user = github_client.get_user()
-        print(f"Authenticated as: {user.login}")
+    return RateLimiter(
+        requests_per_minute=int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", DEFAULT_LLM_REQUESTS_PER_MINUTE)),
+        tokens_per_minute=int(os.getenv("OPENAI_TOKENS_PER_MINUTE", DEFAULT_LLM_TOKENS_PER_MINUTE)),
+        max_concurrency=llm_concurrency(),
+    )
+
+# GitHub request budget shared by all repository workers
+DEFAULT_GITHUB_REQUESTS_PER_MINUTE = 60
+DEFAULT_GITHUB_CONCURRENCY = 4
+
+def initialize_github_rate_limiter():
+    """
+    Initialize the scheduler shared by every GitHub GraphQL call.
+    It follows the rate-limit budget GitHub reports in response headers;
+    keeping few requests in flight avoids GitHub's secondary rate limits.
+    """
+    return GitHubRateScheduler(
+        requests_per_minute=int(os.getenv("GITHUB_REQUESTS_PER_MINUTE", DEFAULT_GITHUB_REQUESTS_PER_MINUTE)),
+        max_concurrency=max(1, int(os.getenv("GITHUB_MAX_CONCURRENCY", DEFAULT_GITHUB_CONCURRENCY))),
+    )
+
+def initialize_response_cache(no_cache=False, refresh=False):
+    """
+    Open the persistent LLM response cache, or return None when caching is
+    disabled. With refresh=True cached responses are ignored and overwritten.
+    """
+    if no_cache:
+        return None
+    return ResponseCache(os.getenv("PR_ANALYSES_CACHE_PATH", DEFAULT_CACHE_PATH), refresh=refresh)
+
+def initialize_pr_store():
+    """Open the local store of fetched PRs and their analyses."""
+    return PRStore(os.getenv("PR_ANALYSES_STORE_PATH", DEFAULT_STORE_PATH))
+
+def initialize_run_journal():
+    """Open the journal that records each run's progress for --resume."""
+    return RunJournal(os.getenv("PR_ANALYSES_JOURNAL_PATH", DEFAULT_JOURNAL_PATH))
+
+def llm_concurrency():
+    """Maximum number of concurrent OpenAI requests."""
+    return max(1, int(os.getenv("OPENAI_MAX_CONCURRENCY", DEFAULT_LLM_CONCURRENCY)))
+
+# Server-side PR discovery
+# The search API returns at most 1000 results per query
+SEARCH_RESULT_CAP = 1000
+# Size of the sub-windows a date range is split into before searching
+DISCOVERY_WINDOW_DAYS = 30
+# PRs per batched GraphQL search page
+GRAPHQL_PAGE_SIZE = 50
+# Above this many distinct consumer filters, one unfiltered query per sub-window costs fewer pages
+FILTERED_SCAN_MAX_QUERIES = 4
+# Sub-windows searched concurrently, ahead of the one whose PRs are being yielded
+DISCOVERY_PREFETCH_WINDOWS = 3
+
+def format_search_date(value):
+    """Format a (naive, UTC) datetime for a search date qualifier."""
+    return value.strftime('%Y-%m-%dT%H:%M:%S') + '+00:00'
+
+def build_merged_pr_query(repo_name, start_date, end_date):
+    """Build a search query for PRs merged into a repository within an inclusive date range."""
+    qualifiers = [f"repo:{repo_name}", "is:pr", "is:merged",
+                  f"merged:{format_search_date(start_date)}..{format_search_date(end_date)}"]
+    return " ".join(qualifiers)
+
+def split_date_window(start_date, end_date, window_days=DISCOVERY_WINDOW_DAYS):
+    """Split an inclusive date range into non-overlapping inclusive sub-windows, newest first."""
+    windows = []
+    window_end = end_date
+    while window_end >= start_date:
+        window_start = max(start_date, window_end - datetime.timedelta(days=window_days) + datetime.timedelta(seconds=1))
+        windows.append((window_start, window_end))
+        window_end = window_start - datetime.timedelta(seconds=1)
+    return windows
+
+class DiscoveryStats:
+    """Thread-safe counter of the GraphQL requests made during discovery, by stage."""
+    def __init__(self):
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def add_request(self, stage):
+        with self._lock:
+            self.requests[stage] = self.requests.get(stage, 0) + 1
+
+    def summary(self):
+        search_pages = self.requests.get("graphql:search", 0)
+        review_pages = self.requests.get("graphql:reviews", 0)
+        return (f"{search_pages + review_pages} GraphQL requests: "
+                f"{search_pages} search pages and {review_pages} extra review pages")
+
+def parse_github_datetime(value):
+    """Parse a GraphQL timestamp into a naive UTC datetime."""
+    return datetime.datetime.strptime(value, '%Y-%m-%dT%H:%M:%SZ') if value else None
+
+def _search_nodes_window(graphql_client, repo_name, start_date, end_date, extra_qualifiers, page_size, stats=None):
+    query = f"{build_merged_pr_query(repo_name, start_date, end_date)} {extra_qualifiers}".strip()
+    pages = search_pull_requests(graphql_client, repo_name, query, page_size=page_size,
+                                 on_request=stats.add_request if stats else None)
+    for issue_count, nodes in pages:
+        if issue_count > SEARCH_RESULT_CAP and end_date - start_date > datetime.timedelta(seconds=1):
+            pages.close()
+            midpoint = (start_date + (end_date - start_date) / 2).replace(microsecond=0)
+            yield from _search_nodes_window(graphql_client, repo_name, midpoint + datetime.timedelta(seconds=1),
+                                            end_date, extra_qualifiers, page_size, stats)
+            yield from _search_nodes_window(graphql_client, repo_name, start_date, midpoint,
+                                            extra_qualifiers, page_size, stats)
+            return
+        yield from nodes
+
+def review_bodies_by(node, reviewer):
+    """Return the non-empty review bodies a user left on a GraphQL PR node."""
+    return [review['body'] for review in node['reviews']['nodes']
+            if review['author'] and review['author']['login'] == reviewer
+            and review['body'] and review['body'].strip()]
+
+def authored_pr_from_node(node):
+    """Build the authored PR dict from a GraphQL PR node."""
+    return {
+        'number': node['number'],
+        'title': node['title'],
+        'description': node['body'] or None,
+        'url': node['url'],
+        'created_at': node['createdAt'][:10],
+        'merged_at': node['mergedAt'][:10],
+        'author': node['author']['login'] if node['author'] else None,
+        'changed_files': node['changedFiles'],
+        'additions': node['additions'],
+        'deletions': node['deletions'],
+    }
+
+def reviewed_pr_from_node(node, review_comments):
+    """Build the reviewed PR dict from a GraphQL PR node."""
+    return {
+        'number': node['number'],
+        'title': node['title'],
+        'description': node['body'] or None,
+        'url': node['url'],
+        'author': node['author']['login'] if node['author'] else None,
+        'created_at': node['createdAt'][:10],
+        'merged_at': node['mergedAt'][:10],
+        'user_reviews': review_comments,
+        'changed_files': node['changedFiles'],
+        'additions': node['additions'],
+        'deletions': node['deletions'],
+    }
+
+# Shared PR scanning
+class PRConsumer:
+    """
+    Receives PR nodes from a repository scan. Subclasses turn the nodes they
+    care about into PR dicts and ignore the rest.
+    """
+    # Search qualifiers selecting the PRs this consumer can accept; "" means every PR
+    search_qualifiers = ""
+    kind = None
+
+    def __init__(self, start_date, end_date):
+        self.start_date = start_date
+        self.end_date = end_date
+
+    def in_window(self, merged_at):
+        return self.start_date <= merged_at < self.end_date
+
+    def consume(self, node):
+        """Return the PR dict for a node, or None to skip it."""
+        raise NotImplementedError
+
+class AuthoredPRConsumer(PRConsumer):
+    """Collects merged PRs authored by a user."""
+    kind = 'authored'
+
+    def __init__(self, start_date, end_date, author):
+        super().__init__(start_date, end_date)
+        self.author = author
+        self.user = author
+        self.search_qualifiers = f"author:{author}"
+
+    def consume(self, node):
+        if node['author'] and node['author']['login'] == self.author:
+            return authored_pr_from_node(node)
+        return None
+
+class ReviewedPRConsumer(PRConsumer):
+    """Collects merged PRs a user substantively reviewed, excluding PRs they authored."""
+    kind = 'reviewed'
+
+    def __init__(self, start_date, end_date, reviewer):
+        super().__init__(start_date, end_date)
+        self.reviewer = reviewer
+        self.user = reviewer
+        self.search_qualifiers = f"reviewed-by:{reviewer} -author:{reviewer}"
+
+    def consume(self, node):
+        # Skip if the reviewer is also the author (exclude self-authored PRs)
+        if node['author'] and node['author']['login'] == self.reviewer:
+            return None
         
-        repo = github_client.get_repo(repo_name)
-        print(f"Successfully accessed repository: {repo.full_name}")
+        review_comments = review_bodies_by(node, self.reviewer)
+        if not review_comments:
+            return None
         
-        # Get all closed PRs
-        prs = repo.get_pulls(state='closed', sort='updated', direction='desc')
+        # Skip if PR title contains "translation" or "translations"
+        if "translation" in node['title'].lower():
+            print(f"Skipping translation PR #{node['number']}: {node['title']}")
+            return None
         
-        relevant_prs = []
-        for pr in prs:
-            # Skip if we're filtering by author and this PR isn't by that author
-            if author and pr.user.login != author:
-                continue
-                
-            # Skip if we only want merged PRs and this one wasn't merged
-            if merged_only and not pr.merged:
-                continue
-                
-            # Check if the PR was merged within our date range
-            merge_date = pr.merged_at if pr.merged else None
-            
-            if merge_date and merge_date >= start_date and merge_date <= end_date:
-                relevant_prs.append({
-                    'number': pr.number,
-                    'title': pr.title,
-                    'description': pr.body,
-                    'url': pr.html_url,
-                    'created_at': pr.created_at.strftime('%Y-%m-%d'),
-                    'merged_at': merge_date.strftime('%Y-%m-%d') if merge_date else None,
-                    'author': pr.user.login,
-                    'changed_files': pr.changed_files,
-                    'additions': pr.additions,
-                    'deletions': pr.deletions,
-                })
-            # Stop if we've gone beyond our time range
-            elif merge_date and merge_date < start_date:
-                break
-                
-        if author:
-            print(f"Found {len(relevant_prs)} {'merged ' if merged_only else ''}PRs by {author} in the specified time range.")
-        else:
-            print(f"Found {len(relevant_prs)} {'merged ' if merged_only else ''}PRs in the specified time range.")
-        return relevant_prs
-    except GithubException as e:
-        if e.status == 404:
-            print(f"Error: Repository '{repo_name}' not found or not accessible with current token.")
-            print("If this is a private repository, please check your token permissions.")
-            print(f"Detailed error: {e}")
-        else:
-            print(f"GitHub API error: {e}")
-        return []
-    except Exception as e:
-        print(f"Error fetching PRs: {e}")
-        return []
-
-# PR Fetching modifications to include PRs you reviewed
-def fetch_prs_reviewed(github_client, repo_name, start_date=None, end_date=None, reviewer=None):
-    """Fetch PRs that were reviewed by the specified user, excluding PRs they authored."""
-    if not end_date:
-        end_date = datetime.datetime.now()
-    if not start_date:
-        start_date = end_date - relativedelta(months=6)
+        # Skip if user has fewer than 2 substantive review comments
+        substantive_reviews = [body for body in review_comments if len(body.strip()) > 10]  # Consider a comment substantive if > 10 chars
+        if len(substantive_reviews) < 2:
+            print(f"Skipping PR #{node['number']} with fewer than 2 substantive comments")
+            return None
         
-    print(f"Fetching PRs reviewed by {reviewer} between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}...")
-    print(f"Excluding PRs authored by {reviewer}")
+        return reviewed_pr_from_node(node, review_comments)
+
+def scan_queries(consumers, updated_since=None):
+    """
+    Return the extra qualifiers of the search queries that cover every
+    consumer: one query per distinct consumer filter, so the server only
+    returns PRs someone can accept. With more than FILTERED_SCAN_MAX_QUERIES
+    filters, as in team mode, a single unfiltered query is cheaper.
+    """
+    qualifier_sets = sorted({consumer.search_qualifiers for consumer in consumers})
+    if "" in qualifier_sets or len(qualifier_sets) > FILTERED_SCAN_MAX_QUERIES:
+        qualifier_sets = [""]
+    if updated_since:
+        qualifier_sets = [f"{qualifiers} updated:>={format_search_date(updated_since)}".strip()
+                          for qualifiers in qualifier_sets]
+    return qualifier_sets
+
+# Marks the end of a sub-window's nodes in its prefetch queue
+_WINDOW_DONE = object()
+
+def _prefetch_window(graphql_client, repo_name, window_start, window_end, queries, page_size, stats, nodes, stop):
+    """
+    Put the PR nodes of one sub-window on the bounded nodes queue as they
+    arrive, each PR once, followed by _WINDOW_DONE or the exception that
+    ended the search. Stops early once stop is set.
+    """
+    def put(item):
+        while not stop.is_set():
+            try:
+                nodes.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
     
+    seen = set()
     try:
-        repo = github_client.get_repo(repo_name)
-        # Get all merged PRs
-        prs = repo.get_pulls(state='closed', sort='updated', direction='desc')
-        
-        reviewed_prs = []
-        for pr in prs:
-            # Skip if PR wasn't merged or is outside our date range
-            if not pr.merged or pr.merged_at < start_date or pr.merged_at > end_date:
-                continue
-                
-            # Skip if the reviewer is also the author (exclude self-authored PRs)
-            if pr.user.login == reviewer:
-                continue
-            
-            # Skip if PR title contains "translation" or "translations"
-            if "translation" in pr.title.lower():
-                print(f"Skipping translation PR #{pr.number}: {pr.title}")
-                continue
-                
-            # Check if user reviewed this PR
-            reviews = list(pr.get_reviews())
-            user_reviews = [review for review in reviews if review.user.login == reviewer]
-            
-            # Skip if user has fewer than 2 substantive review comments
-            substantive_reviews = []
-            for review in user_reviews:
-                if review.body and len(review.body.strip()) > 10:  # Consider a comment substantive if > 10 chars
-                    substantive_reviews.append(review.body)
-                    
-            if len(substantive_reviews) < 2:
-                print(f"Skipping PR #{pr.number} with fewer than 2 substantive comments")
-                continue
-            
-            if user_reviews:
-                # User reviewed this PR
-                review_comments = []
-                for review in user_reviews:
-                    if review.body and review.body.strip():
-                        review_comments.append(review.body)
-                
-                reviewed_prs.append({
-                    'number': pr.number,
-                    'title': pr.title,
-                    'description': pr.body,
-                    'url': pr.html_url,
-                    'author': pr.user.login,
-                    'created_at': pr.created_at.strftime('%Y-%m-%d'),
-                    'merged_at': pr.merged_at.strftime('%Y-%m-%d'),
-                    'user_reviews': review_comments,
-                    'changed_files': pr.changed_files,
-                    'additions': pr.additions,
-                    'deletions': pr.deletions,
-                })
-        
-        print(f"Found {len(reviewed_prs)} PRs reviewed by {reviewer} (excluding self-authored PRs) in the specified time range.")
-        return reviewed_prs
+        for extra_qualifiers in queries:
+            for node in _search_nodes_window(graphql_client, repo_name, window_start, window_end, extra_qualifiers, page_size, stats):
+                if node['number'] not in seen:
+                    seen.add(node['number'])
+                    if not put(node):
+                        return
     except Exception as e:
-        print(f"Error fetching reviewed PRs: {e}")
-        return []
+        put(e)
+        return
+    put(_WINDOW_DONE)
+
+def iter_scan(graphql_client, repo_name, consumers, updated_since=None,
+              window_days=DISCOVERY_WINDOW_DAYS, page_size=GRAPHQL_PAGE_SIZE, prefetch=DISCOVERY_PREFETCH_WINDOWS):
+    """
+    Scan the PRs merged into a repository and yield (consumer, pr) for every
+    consumer that accepts a PR inside its date window. Each sub-window runs
+    the queries from scan_queries for the consumers whose window overlaps
+    it; a PR matched by several of them is routed to the consumers once, so
+    pages and reviews are shared between consumers. Up to prefetch
+    sub-windows are searched concurrently, but PRs are yielded newest
+    sub-window first, as each search page arrives. Sub-windows not yet
+    started are dropped when the caller stops early.
+    With updated_since, only PRs updated at or after that time are scanned.
+    """
+    start_date = min(consumer.start_date for consumer in consumers)
+    # Consumer windows end exclusively; search date ranges are inclusive
+    end_date = max(consumer.end_date for consumer in consumers) - datetime.timedelta(seconds=1)
+    windows = iter(split_date_window(start_date, end_date, window_days=window_days))
+    
+    stats = DiscoveryStats()
+    scanned = 0
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=max(1, prefetch))
+    pending = []
+    
+    def submit(window):
+        window_start, window_end = window
+        active = [consumer for consumer in consumers
+                  if consumer.start_date <= window_end and consumer.end_date > window_start]
+        # A full queue pauses the search, so prefetched windows hold about two pages each
+        nodes = queue.Queue(maxsize=2 * page_size)
+        executor.submit(_prefetch_window, graphql_client, repo_name, window_start, window_end,
+                        scan_queries(active, updated_since), page_size, stats, nodes, stop)
+        pending.append((active, nodes))
+    
+    try:
+        for window in itertools.islice(windows, max(1, prefetch)):
+            submit(window)
+        while pending:
+            active, nodes = pending.pop(0)
+            for node in iter(nodes.get, _WINDOW_DONE):
+                if isinstance(node, Exception):
+                    raise node
+                scanned += 1
+                merged_at = parse_github_datetime(node['mergedAt'])
+                for consumer in active:
+                    if consumer.in_window(merged_at):
+                        pr = consumer.consume(node)
+                        if pr is not None:
+                            yield consumer, pr
+            window = next(windows, None)
+            if window:
+                submit(window)
+    finally:
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    
+    print(f"Scanned {scanned} merged PRs in {repo_name} with {stats.summary()}")
+
+# Incremental runs
+# Overlap between consecutive scans so PRs updated while a scan runs are not missed
+WATERMARK_OVERLAP = datetime.timedelta(minutes=10)
+
+def utc_now():
+    """Current time as a naive UTC datetime, matching GitHub timestamps."""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def incremental_scan_start(watermark, start_date, end_date):
+    """
+    Return the updated-since cutoff for an incremental scan, or None when the
+    previous scan does not cover the requested window and a full scan is needed.
+    Every PR merged before the previous scan must lie inside the window that
+    scan covered; PRs merged after it were also updated after it.
+    """
+    if watermark is None:
+        return None
+    if watermark['window_start'] > start_date:
+        return None
+    if watermark['window_end'] < min(end_date, watermark['updated_since']):
+        return None
+    return watermark['updated_since']
+
+def iter_refreshed_team_prs(graphql_client, store, repo_name, users, start_date, end_date, full_refresh=False):
+    """
+    Fetch PRs each user authored or reviewed into the store in one scan of
+    the repository, yielding (user, kind, pr) for each PR as soon as it is
+    stored. After the first run only PRs updated since the users' previous
+    scans are fetched, unless full_refresh is set. Watermarks only move once
+    the scan has completed, and then cover just the scanned window.
+    """
+    watermarks = {user: None if full_refresh else store.get_watermark(repo_name, user) for user in users}
+    scan_starts = [incremental_scan_start(watermarks[user], start_date, end_date) for user in users]
+    updated_since = None if None in scan_starts else min(scan_starts)
+    who = users[0] if len(users) == 1 else f"{len(users)} users"
+    if updated_since:
+        print(f"Fetching PRs authored or reviewed by {who} updated since {updated_since.strftime('%Y-%m-%d %H:%M')} UTC...")
+    else:
+        print(f"Fetching PRs authored or reviewed by {who} between {start_date.strftime('%Y-%m-%d')} and {end_date.strftime('%Y-%m-%d')}...")
+    
+    scan_started = utc_now()
+    consumers = []
+    for user in users:
+        consumers += [AuthoredPRConsumer(start_date, end_date, user), ReviewedPRConsumer(start_date, end_date, user)]
+    counts = {'authored': 0, 'reviewed': 0}
+    # The scan is timed across its yields, without the analysis and writing done in between
+    for consumer, pr in timed_iter("scan", iter_scan(graphql_client, repo_name, consumers, updated_since=updated_since)):
+        store.upsert_prs(repo_name, consumer.user, consumer.kind, [pr])
+        counts[consumer.kind] += 1
+        yield consumer.user, consumer.kind, pr
+    
+    # Only [start_date, end_date] is current now; parts of an older, wider window were not rescanned
+    for user in users:
+        store.set_watermark(repo_name, user, scan_started - WATERMARK_OVERLAP, start_date, end_date)
+    print(f"Fetched {counts['authored']} new or updated PRs by {who} and {counts['reviewed']} PRs reviewed by {who}.")
+
+def iter_refreshed_prs(graphql_client, store, repo_name, user, start_date, end_date, full_refresh=False):
+    """Single-user iter_refreshed_team_prs, yielding (kind, pr)."""
+    for _, kind, pr in iter_refreshed_team_prs(graphql_client, store, repo_name, [user], start_date, end_date, full_refresh=full_refresh):
+        yield kind, pr
+
+def index_team_prs(graphql_client, store, repo_name, users, start_date, end_date, full_refresh=False):
+    """
+    Fetch the PRs of every user in one scan and index them by login. Returns
+    {login: [(kind, pr), ...]} with an entry for every user.
+    """
+    index = {user: [] for user in users}
+    for user, kind, pr in iter_refreshed_team_prs(graphql_client, store, repo_name, users, start_date, end_date, full_refresh=full_refresh):
+        index[user].append((kind, pr))
+    return index
+
+# Snapshot records are written to the replay store in batches of this many PRs
+SNAPSHOT_LOAD_BATCH = 500
+
+def load_snapshot_store(store, snapshot_path, repo_names, users, start_date, end_date):
+    """
+    Read a snapshot once into store, keeping the records of the given
+    repositories and users merged on or after start_date and before end_date.
+    Returns the number of records loaded.
+    """
+    repo_names, users = set(repo_names), set(users)
+    start, end = start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d')
+    batches = {}
+    count = 0
+    for repo_name, user, kind, pr in iter_snapshot(snapshot_path):
+        if repo_name not in repo_names or user not in users or not start <= (pr.get('merged_at') or '') < end:
+            continue
+        batch = batches.setdefault((repo_name, user, kind), [])
+        batch.append(pr)
+        count += 1
+        if len(batch) >= SNAPSHOT_LOAD_BATCH:
+            store.upsert_prs(repo_name, user, kind, batch)
+            batch.clear()
+    for (repo_name, user, kind), batch in batches.items():
+        if batch:
+            store.upsert_prs(repo_name, user, kind, batch)
+    return count
+
+def open_pr_store(args, repo_names, users):
+    """
+    Open the PR store a command works on, returning (store, close). With
+    --from-snapshot this is a temporary store loaded from the snapshot, so a
+    replay never overwrites the PRs fetched from GitHub into the local store;
+    close() then also deletes it. Analyses made during a replay are kept in
+    the response cache, not the local store.
+    """
+    snapshot_path = getattr(args, 'from_snapshot', None)
+    if not snapshot_path:
+        store = initialize_pr_store()
+        return store, store.close
+    replay_dir = tempfile.TemporaryDirectory(prefix="pr_analyses_replay_")
+    store = PRStore(os.path.join(replay_dir.name, "pr_store.sqlite"))
+    count = load_snapshot_store(store, snapshot_path, repo_names, users, args.start_date, args.end_date)
+    print(f"Loaded {count} PR records from snapshot {snapshot_path}")
+    
+    def close():
+        store.close()
+        replay_dir.cleanup()
+    return store, close
+
+def export_snapshot(store, snapshot_path, repo_names, users, start_date, end_date):
+    """Write the stored PRs of the given repositories and users within the date range to a snapshot."""
+    def records():
+        for repo_name in repo_names:
+            for user in users:
+                for kind in ('authored', 'reviewed'):
+                    for record in store.load_prs(repo_name, user, kind, start_date, end_date):
+                        yield repo_name, user, kind, record['pr_data']
+    
+    count = write_snapshot(snapshot_path, records(), repo_names, users, start_date, end_date)
+    print(f"Exported {count} PR records to snapshot {snapshot_path}")
+    return count
 
 # Utility to load prompt template
 PROMPT_FILE = os.path.join(os.path.dirname(__file__), '..', 'prompt.txt')
@@ -218,10 +560,96 @@ def load_prompt_template():
         )
 
 # PR Analysis with OpenAI
-def analyze_pr_impact(openai_client, pr_data, is_authored=True):
-    """Analyze the impact of a PR using OpenAI."""
-    print(f"Analyzing {'authored' if is_authored else 'reviewed'} PR #{pr_data['number']}: {pr_data['title']}")
+PR_ANALYSIS_SYSTEM_MESSAGE = "You are an expert at creating impactful brag documents for software engineers. Create specific, concrete, and detailed impact statements that precisely follow the requested format."
+
+def estimate_tokens(text):
+    """Cheap token estimate (about 4 characters per token) for rate budgeting."""
+    return len(text) // 4 + 1
+
+_token_encodings = {}
+_token_encodings_lock = threading.Lock()
+
+def get_token_encoding(model=OPENAI_MODEL):
+    """Return the tiktoken encoding for a model, or None when it cannot be loaded."""
+    with _token_encodings_lock:
+        if model not in _token_encodings:
+            # tiktoken gives exact token counts; without it token counts are estimated
+            try:
+                import tiktoken
+            except ImportError:
+                _token_encodings[model] = None
+                return None
+            try:
+                _token_encodings[model] = tiktoken.encoding_for_model(model)
+            except Exception as e:
+                print(f"Tokenizer for {model} unavailable, estimating token counts instead: {e}")
+                _token_encodings[model] = None
+        return _token_encodings[model]
+
+def count_tokens(text, model=OPENAI_MODEL):
+    """Count the tokens in text for a model, falling back to estimate_tokens without tiktoken."""
+    encoding = get_token_encoding(model)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
 
+def create_chat_completion(openai_client, system_message, prompt, rate_limiter=None, model=OPENAI_MODEL, cache=None):
+    """
+    Send a chat completion request and return the response text. Each attempt
+    waits for room in the rate limiter; 429 and 5xx responses are retried with
+    jittered exponential backoff. Responses are served from and stored in the
+    cache when one is given.
+    """
+    key = cache_key(model, system_message, prompt) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            increment("llm.cache_hits")
+            return cached
+        increment("llm.cache_misses")
+
+    estimated = estimate_tokens(system_message) + estimate_tokens(prompt) + EXPECTED_COMPLETION_TOKENS
+
+    def attempt():
+        if not rate_limiter:
+            return send()
+        increment("llm.rate_limit_wait_seconds", rate_limiter.acquire(estimated))
+        with rate_limiter.in_flight():
+            return send()
+
+    def send():
+        with span("llm.request", model=model):
+            # The raw response gives the bytes received, which the parsed one no longer has
+            raw_response = openai_client.chat.completions.with_raw_response.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ]
+            )
+        increment("llm.requests")
+        increment("llm.bytes", len(raw_response.http_response.content))
+        return raw_response.parse()
+
+    def log_retry(error, attempt_number, delay):
+        increment("llm.retries")
+        increment("llm.retry_sleep_seconds", delay)
+        print(f"OpenAI request failed ({error}); retry {attempt_number} in {delay:.1f}s")
+
+    response = call_with_backoff(attempt, on_retry=log_retry)
+    usage = getattr(response, 'usage', None)
+    if usage:
+        increment("llm.prompt_tokens", getattr(usage, 'prompt_tokens', 0) or 0)
+        increment("llm.completion_tokens", getattr(usage, 'completion_tokens', 0) or 0)
+    if rate_limiter and usage:
+        rate_limiter.record_usage(estimated, response.usage.total_tokens)
+    content = response.choices[0].message.content
+    if cache and content is not None:
+        cache.put(key, model, content)
+    return content
+
+def build_pr_prompt(pr_data, is_authored=True):
+    """Render the analysis prompt for a PR."""
     # Load prompt template
     prompt_template = load_prompt_template()
 
@@ -236,26 +664,295 @@ def analyze_pr_impact(openai_client, pr_data, is_authored=True):
     }
 
     if is_authored:
-        prompt = prompt_template.format(**prompt_vars)
-    else:
-        # For reviewed PRs, append review comments
-        review_comments = "\n".join(pr_data.get('user_reviews', []))
-        prompt_vars['pr_review_comments'] = review_comments or 'Review comments not available'
-        prompt = prompt_template.format(**prompt_vars) + f"\n\nMy Review Comments: {prompt_vars['pr_review_comments']}"
+        return prompt_template.format(**prompt_vars)
+    # For reviewed PRs, append review comments
+    review_comments = "\n".join(pr_data.get('user_reviews', []))
+    prompt_vars['pr_review_comments'] = review_comments or 'Review comments not available'
+    return prompt_template.format(**prompt_vars) + f"\n\nMy Review Comments: {prompt_vars['pr_review_comments']}"
 
-    try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert at creating impactful brag documents for software engineers. Create specific, concrete, and detailed impact statements that precisely follow the requested format."},
-                {"role": "user", "content": prompt}
-            ]
+# Per-PR prompt budget; larger prompts are compacted before analysis
+DEFAULT_PR_PROMPT_TOKEN_BUDGET = 8000
+# Fenced code blocks and runs of log lines longer than this are dropped from over-budget prompts
+LARGE_BLOCK_LINES = 15
+PR_CONTEXT_CHUNK_TOKENS = 4000
+PR_CONTEXT_SUMMARY_LEVELS = 3
+
+PR_CONTEXT_SUMMARY_SYSTEM_MESSAGE = "You condense pull request descriptions and review comments for a later impact analysis. Keep what changed, why, the decisions made, concrete numbers and names; drop boilerplate, logs and code."
+
+PR_CONTEXT_SUMMARY_PROMPT = """Summarize this {label} of a pull request in at most {max_words} words.
+
+{text}
+"""
+
+LOG_LINE_PATTERN = re.compile(
+    r'^\s*(\d{4}-\d{2}-\d{2}[ T]\d|\[?\d{2}:\d{2}:\d{2}|at [\w$.<>]+\(|File ".+", line \d+|Traceback \(|'
+    r'\[?(TRACE|DEBUG|INFO|WARN|WARNING|ERROR|FATAL)\b)'
+)
+
+def pr_prompt_token_budget():
+    return int(os.getenv("PR_PROMPT_TOKEN_BUDGET", DEFAULT_PR_PROMPT_TOKEN_BUDGET))
+
+def dedupe_reviews(reviews):
+    """Remove quoted lines ('> ...') from reviews and drop reviews that repeat an earlier one."""
+    seen = set()
+    result = []
+    for review in reviews:
+        text = "\n".join(line for line in review.splitlines() if not line.lstrip().startswith('>')).strip()
+        key = " ".join(text.split()).lower()
+        if key and key not in seen:
+            seen.add(key)
+            result.append(text)
+    return result
+
+def drop_large_blocks(text, max_lines=LARGE_BLOCK_LINES):
+    """Replace fenced code blocks and runs of log lines longer than max_lines with a short placeholder."""
+    lines = text.splitlines()
+    result = []
+    i = 0
+    while i < len(lines):
+        if lines[i].lstrip().startswith('```'):
+            # An unterminated fence runs to the end of the text
+            end = next((j for j in range(i + 1, len(lines)) if lines[j].lstrip().startswith('```')), len(lines))
+            if end - i - 1 > max_lines:
+                result.append(f"[code block of {end - i - 1} lines omitted]")
+            else:
+                result.extend(lines[i:end + 1])
+            i = end + 1
+        elif LOG_LINE_PATTERN.match(lines[i]):
+            # Indented lines inside a run are stack frames or wrapped log messages
+            end = i + 1
+            while end < len(lines) and (LOG_LINE_PATTERN.match(lines[end]) or lines[end].startswith((' ', '\t'))):
+                end += 1
+            if end - i > max_lines:
+                result.append(f"[{end - i} log lines omitted]")
+            else:
+                result.extend(lines[i:end])
+            i = end
+        else:
+            result.append(lines[i])
+            i += 1
+    return "\n".join(result)
+
+def split_paragraphs(text, max_tokens):
+    """Split text into paragraphs, cutting paragraphs longer than max_tokens into equal pieces."""
+    pieces = []
+    for paragraph in text.split("\n\n"):
+        if not paragraph.strip():
+            continue
+        parts = -(-count_tokens(paragraph) // max_tokens)
+        size = -(-len(paragraph) // parts)
+        pieces.extend(paragraph[i:i + size] for i in range(0, len(paragraph), size))
+    return pieces
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text to about max_tokens, marking the cut."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return text
+    return text[:int(len(text) * max_tokens / tokens * 0.95)].rstrip() + "\n[truncated]"
+
+def summarize_pr_text(openai_client, label, text, max_tokens, rate_limiter=None, cache=None):
+    """
+    Condense text to about max_tokens: summarize chunks of paragraphs, then
+    summaries of those, for at most PR_CONTEXT_SUMMARY_LEVELS rounds.
+    Summaries go through the response cache.
+    """
+    for _ in range(PR_CONTEXT_SUMMARY_LEVELS):
+        if count_tokens(text) <= max_tokens:
+            break
+        chunks = pack_chunks(split_paragraphs(text, PR_CONTEXT_CHUNK_TOKENS), PR_CONTEXT_CHUNK_TOKENS)
+        # Aim for about 0.75 words per token across all chunk summaries
+        max_words = max(50, max_tokens * 3 // 4 // len(chunks))
+        text = "\n\n".join(
+            create_chat_completion(openai_client, PR_CONTEXT_SUMMARY_SYSTEM_MESSAGE,
+                                   PR_CONTEXT_SUMMARY_PROMPT.format(label=label, max_words=max_words, text="\n\n".join(chunk)),
+                                   rate_limiter=rate_limiter, cache=cache)
+            for chunk in chunks
         )
-        analysis = response.choices[0].message.content
-        return analysis
+    return text
+
+def build_pr_context(pr_data, is_authored=True, openai_client=None, rate_limiter=None, cache=None, budget=None):
+    """
+    Return (prompt, metadata) for a PR analysis, compacted to fit the per-PR
+    token budget. Over-budget PRs first lose quoted and repeated review text,
+    then large code and log blocks. If that is not enough, the description
+    and reviews are summarized (when openai_client is given) and finally
+    truncated. The prompt is measured again after each step, and compaction
+    stops as soon as it fits. metadata records the prompt tokens before and after compaction
+    and the steps taken.
+    """
+    budget = budget or pr_prompt_token_budget()
+    prompt = build_pr_prompt(pr_data, is_authored)
+    tokens = count_tokens(prompt)
+    metadata = {'prompt_tokens_before': tokens, 'prompt_tokens_after': tokens, 'token_budget': budget, 'compaction': []}
+    if tokens <= budget:
+        return prompt, metadata
+    
+    steps = metadata['compaction']
+    pr = dict(pr_data)
+    reviews = pr.get('user_reviews') or []
+    if not is_authored and reviews:
+        deduped = dedupe_reviews(reviews)
+        if deduped != reviews:
+            pr['user_reviews'] = reviews = deduped
+            steps.append("removed quoted and repeated review text")
+            prompt = build_pr_prompt(pr, is_authored)
+            tokens = count_tokens(prompt)
+    
+    if tokens > budget:
+        description = pr.get('description') or ''
+        compacted_description = drop_large_blocks(description)
+        compacted_reviews = [drop_large_blocks(review) for review in reviews] if not is_authored else reviews
+        if compacted_description != description or compacted_reviews != reviews:
+            if compacted_description != description:
+                pr['description'] = compacted_description
+            pr['user_reviews'] = compacted_reviews
+            steps.append("dropped large code and log blocks")
+            prompt = build_pr_prompt(pr, is_authored)
+            tokens = count_tokens(prompt)
+    
+    if tokens > budget:
+        # Share what is left after the fixed part of the prompt between the description and the reviews
+        fields = [('description', "description")]
+        if not is_authored and pr.get('user_reviews'):
+            fields.append(('user_reviews', "review comments"))
+        fixed = count_tokens(build_pr_prompt(dict(pr, description='', user_reviews=[]), is_authored))
+        share = max(100, (budget - fixed) // len(fields))
+        for field, label in fields:
+            text = pr.get(field) or ''
+            if field == 'user_reviews':
+                text = "\n\n".join(text)
+            if count_tokens(text) <= share:
+                continue
+            if openai_client:
+                try:
+                    text = summarize_pr_text(openai_client, label, text, share, rate_limiter=rate_limiter, cache=cache)
+                    steps.append(f"summarized the {label}")
+                except Exception as e:
+                    print(f"Error summarizing the {label} of PR #{pr['number']}: {e}")
+            if count_tokens(text) > share:
+                text = truncate_to_tokens(text, share)
+                steps.append(f"truncated the {label}")
+            pr[field] = [text] if field == 'user_reviews' else text
+        prompt = build_pr_prompt(pr, is_authored)
+        tokens = count_tokens(prompt)
+    
+    metadata['prompt_tokens_after'] = tokens
+    increment("llm.compacted_prompts")
+    increment("llm.prompt_tokens_saved", metadata['prompt_tokens_before'] - tokens)
+    print(f"Compacted PR #{pr['number']} prompt from {metadata['prompt_tokens_before']} to {tokens} tokens ({', '.join(steps) or 'no change'})")
+    return prompt, metadata
+
+def analysis_fingerprint(pr_data, is_authored=True):
+    """
+    Identify the analysis request for a PR. A stored analysis is current only
+    while the PR data, prompt template, system message and model are unchanged.
+    """
+    return cache_key(OPENAI_MODEL, PR_ANALYSIS_SYSTEM_MESSAGE, build_pr_prompt(pr_data, is_authored))
+
+ANALYSIS_ERROR_PREFIX = "Error analyzing PR: "
+
+def is_failed_analysis(analysis):
+    return analysis is None or analysis.startswith(ANALYSIS_ERROR_PREFIX)
+
+def analyze_pr_impact(openai_client, pr_data, is_authored=True, rate_limiter=None, cache=None, prompt=None):
+    """Analyze the impact of a PR using OpenAI. prompt defaults to the PR's compacted context."""
+    print(f"Analyzing {'authored' if is_authored else 'reviewed'} PR #{pr_data['number']}: {pr_data['title']}")
+
+    if prompt is None:
+        prompt, _ = build_pr_context(pr_data, is_authored, openai_client, rate_limiter=rate_limiter, cache=cache)
+
+    try:
+        with span("analyze_pr", pr=pr_data['url']):
+            return create_chat_completion(openai_client, PR_ANALYSIS_SYSTEM_MESSAGE, prompt, rate_limiter=rate_limiter, cache=cache)
     except Exception as e:
+        increment("llm.failed_analyses")
         print(f"Error analyzing PR: {e}")
-        return f"Error analyzing PR: {e}"
+        return f"{ANALYSIS_ERROR_PREFIX}{e}"
+
+def analyze_stored_pr(openai_client, store, repo_name, user, kind, record, rate_limiter=None, cache=None, refresh=False):
+    """
+    Return the analysis for a stored PR record, analyzing it only when the
+    stored analysis is missing or stale, or always with refresh. Successful
+    analyses are saved, replacing the stored one.
+    """
+    is_authored = kind == 'authored'
+    pr = record['pr_data']
+    fingerprint = analysis_fingerprint(pr, is_authored)
+    if not refresh and record['analysis'] is not None and record['analysis_fingerprint'] == fingerprint:
+        return record['analysis']
+    
+    prompt, metadata = build_pr_context(pr, is_authored, openai_client, rate_limiter=rate_limiter, cache=cache)
+    analysis = analyze_pr_impact(openai_client, pr, is_authored=is_authored, rate_limiter=rate_limiter, cache=cache, prompt=prompt)
+    if not is_failed_analysis(analysis):
+        store.save_analysis(repo_name, user, kind, pr['number'], analysis, fingerprint, metadata)
+        record['analysis_meta'] = metadata
+    return analysis
+
+# Batch API mode
+BATCH_STATE_DIR = ".pr_analyses_cache/batches"
+
+def batch_state_path(repo_name, user):
+    """Where the running batch for a repository and user is remembered between runs."""
+    directory = os.getenv("PR_ANALYSES_BATCH_DIR", BATCH_STATE_DIR)
+    return os.path.join(directory, f"{repo_name.replace('/', '_')}_{user}.json")
+
+def analyze_records_in_batch(openai_client, store, repo_name, user, work, rate_limiter=None, cache=None, refresh=False):
+    """
+    Analyze the stale or missing analyses among work ([(kind, record)]),
+    or every record with refresh, through the OpenAI Batch API. Prompts are compacted to the per-PR token
+    budget first; the summaries compaction may need are interactive
+    requests and wait for rate_limiter like any other. Successful results
+    are saved to the store and the response cache as soon as a batch
+    finishes. Records are updated in place, so analyze_stored_pr returns
+    their new analyses without further calls.
+    """
+    pending = {}
+    prompts = {}
+    for kind, record in work:
+        is_authored = kind == 'authored'
+        fingerprint = analysis_fingerprint(record['pr_data'], is_authored)
+        if not refresh and record['analysis'] is not None and record['analysis_fingerprint'] == fingerprint:
+            continue
+        prompt, metadata = build_pr_context(record['pr_data'], is_authored, openai_client, rate_limiter=rate_limiter, cache=cache)
+        # Requests are keyed like interactive ones, so both modes share the response cache
+        key = cache_key(OPENAI_MODEL, PR_ANALYSIS_SYSTEM_MESSAGE, prompt)
+        cached = cache.get(key) if cache else None
+        if cached is not None:
+            store.save_analysis(repo_name, user, kind, record['pr_data']['number'], cached, fingerprint, metadata)
+            record['analysis'], record['analysis_fingerprint'], record['analysis_meta'] = cached, fingerprint, metadata
+            continue
+        pending.setdefault(key, []).append((kind, record, fingerprint, metadata))
+        prompts[key] = prompt
+    
+    if not pending:
+        return
+    print(f"[{repo_name}] {len(pending)} PRs need analysis; submitting them as a batch")
+    
+    requests = {key: (OPENAI_MODEL, PR_ANALYSIS_SYSTEM_MESSAGE, prompt) for key, prompt in prompts.items()}
+    
+    def save(results):
+        for key, (content, error) in results.items():
+            if content is None:
+                continue
+            if cache:
+                cache.put(key, OPENAI_MODEL, content)
+            for kind, record, fingerprint, metadata in pending.get(key, []):
+                store.save_analysis(repo_name, user, kind, record['pr_data']['number'], content, fingerprint, metadata)
+    
+    poll_interval = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", DEFAULT_POLL_INTERVAL))
+    results = run_batch(openai_client, requests, batch_state_path(repo_name, user), poll_interval=poll_interval,
+                        metadata={'repo': repo_name, 'user': user}, on_results=save)
+    failed = 0
+    for key, items in pending.items():
+        content, error = results[key]
+        if content is None:
+            failed += 1
+            print(f"Error analyzing PR #{items[0][1]['pr_data']['number']} in batch: {error}")
+            content = f"{ANALYSIS_ERROR_PREFIX}{error}"
+        for kind, record, fingerprint, metadata in items:
+            record['analysis'], record['analysis_fingerprint'], record['analysis_meta'] = content, fingerprint, metadata
+    print(f"[{repo_name}] Batch analysis finished: {len(pending) - failed} succeeded, {failed} failed")
 
 # New file output functions
 def create_output_directory(dir_name="pr_analyses_output"):
@@ -264,8 +961,24 @@ def create_output_directory(dir_name="pr_analyses_output"):
         os.makedirs(dir_name)
     return dir_name
 
-def write_pr_analysis_to_file(pr_data, analysis, output_dir):
-    """Write PR analysis to a markdown file."""
+def write_file_atomic(filepath, content):
+    """Write a file through a temporary file, so a crash never leaves it half written."""
+    tmp_path = f"{filepath}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, filepath)
+
+def format_prompt_tokens(metadata):
+    """Describe the prompt size recorded by build_pr_context for a PR file."""
+    before, after = metadata['prompt_tokens_before'], metadata['prompt_tokens_after']
+    if not metadata.get('compaction'):
+        return str(before)
+    return f"{before} (compacted to {after}: {', '.join(metadata['compaction'])})"
+
+def write_pr_analysis_to_file(pr_data, analysis, output_dir, metadata=None):
+    """Write PR analysis to a markdown file. metadata from build_pr_context adds the prompt token counts."""
     filename = f"PR_{pr_data['number']}_{pr_data['title'].replace(' ', '_')[:30]}.md"
     # Remove any invalid characters from filename
     filename = ''.join(c for c in filename if c.isalnum() or c in ['_', '-', '.'])
@@ -278,6 +991,7 @@ def write_pr_analysis_to_file(pr_data, analysis, output_dir):
     changed_files = pr_data.get('changed_files', 'N/A')
     additions = pr_data.get('additions', 'N/A')
     deletions = pr_data.get('deletions', 'N/A')
+    prompt_tokens = f"Prompt Tokens: {format_prompt_tokens(metadata)}\n" if metadata else ""
     
     content = f"""# PR #{pr_data['number']} - {pr_data['title']} - Impact Analysis
 
@@ -288,47 +1002,126 @@ Merged: {merged_at}
 Changed Files: {changed_files}
 Additions: {additions}
 Deletions: {deletions}
-
+{prompt_tokens}
 ## Impact Analysis
 
 {analysis}
 """
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(content)
+    with span("write_pr_file", pr=pr_data['url']):
+        write_file_atomic(filepath, content)
     
     return filepath
 
-def create_brag_doc_summary(authored_analyses, reviewed_analyses, repo_name, output_dir):
-    """Create a brag doc summary markdown file."""
-    today = datetime.datetime.now().strftime('%Y-%m-%d')
-    filename = f"Brag_Doc_Summary_{repo_name.replace('/', '_')}_{today}.md"
-    filepath = os.path.join(output_dir, filename)
+BRAG_DOC_SECTIONS = {
+    'authored': "## PRs Authored: Key Contributions & Impact",
+    'reviewed': "## PRs Reviewed: Key Contributions & Impact",
+}
+
+class BragDocWriter:
+    """
+    Writes the brag doc summary incrementally as analyses complete.
+
+    Authored entries are appended to the document and reviewed entries to a
+    side file that is appended to the document on close. Entries arriving out
+    of order are held back until their predecessors arrive, so the document
+    lists PRs in sequence order however the analyses finish. Nothing is
+    written until the first entry arrives. The document is written under a
+    temporary name and only appears once close() completes it; discard()
+    removes an unfinished one. The assessment period is taken from
+    start_date and end_date when given.
+    """
+    def __init__(self, repo_name, output_dir, start_date=None, end_date=None):
+        self._today = datetime.datetime.now().strftime('%Y-%m-%d')
+        filename = f"Brag_Doc_Summary_{repo_name.replace('/', '_')}_{self._today}.md"
+        self.repo_name = repo_name
+        self.filepath = os.path.join(output_dir, filename)
+        self._tmp_path = self.filepath + ".tmp"
+        self._reviewed_path = self.filepath + ".reviewed.part"
+        self._pending = {}
+        self._next_seq = 0
+        self._files = None
+        self._period = "September 2024 - March 2025"
+        if start_date and end_date:
+            # end_date is midnight after the last day of the period
+            self._period = f"{start_date.strftime('%B %Y')} - {(end_date - datetime.timedelta(seconds=1)).strftime('%B %Y')}"
     
-    summary_content = f"""# Impact Assessment Brag Document
+    def _write_entry(self, kind, analysis):
+        if self._files is None:
+            self._files = {
+                'authored': open(self._tmp_path, 'w', encoding='utf-8'),
+                'reviewed': open(self._reviewed_path, 'w', encoding='utf-8'),
+            }
+            self._files['authored'].write(f"""# Impact Assessment Brag Document
 
-Repository: {repo_name}
-Assessment Period: September 2024 - March 2025
-Analysis Date: {today}
+Repository: {self.repo_name}
+Assessment Period: {self._period}
+Analysis Date: {self._today}
 
-## PRs Authored: Key Contributions & Impact
+{BRAG_DOC_SECTIONS['authored']}
 
-"""
-    
-    # Add authored PRs
-    for analysis in authored_analyses:
-        summary_content += f"- {analysis['analysis']}\n\n"
-    
-    summary_content += "\n## PRs Reviewed: Key Contributions & Impact\n\n"
+""")
+        self._files[kind].write(f"- {analysis}\n\n")
+        self._files[kind].flush()
     
-    # Add reviewed PRs
-    for analysis in reviewed_analyses:
-        summary_content += f"- {analysis['analysis']}\n\n"
+    def add(self, seq, kind, analysis):
+        """
+        Add the analysis of the seq-th PR; sequence numbers start at 0 and
+        must not repeat. An analysis of None leaves the PR out of the document.
+        """
+        self._pending[seq] = (kind, analysis)
+        while self._next_seq in self._pending:
+            kind, analysis = self._pending.pop(self._next_seq)
+            if analysis is not None:
+                self._write_entry(kind, analysis)
+            self._next_seq += 1
     
-    with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(summary_content)
+    @timed("write_brag_doc")
+    def close(self):
+        """
+        Write any held-back entries, join the sections and return the
+        document path, or None when no entry was ever added.
+        """
+        for seq in sorted(self._pending):
+            kind, analysis = self._pending[seq]
+            if analysis is not None:
+                self._write_entry(kind, analysis)
+        self._pending = {}
+        if self._files is None:
+            return None
+        
+        self._files['reviewed'].close()
+        summary = self._files['authored']
+        summary.write(f"\n{BRAG_DOC_SECTIONS['reviewed']}\n\n")
+        with open(self._reviewed_path, 'r', encoding='utf-8') as f:
+            for chunk in iter(lambda: f.read(65536), ''):
+                summary.write(chunk)
+        summary.flush()
+        os.fsync(summary.fileno())
+        summary.close()
+        os.replace(self._tmp_path, self.filepath)
+        os.remove(self._reviewed_path)
+        return self.filepath
     
-    return filepath
+    def discard(self):
+        """Drop an unfinished document, leaving any earlier brag doc at filepath untouched."""
+        self._pending = {}
+        if self._files is None:
+            return
+        for f in self._files.values():
+            f.close()
+        for path in (self._tmp_path, self._reviewed_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._files = None
+
+def create_brag_doc_summary(authored_analyses, reviewed_analyses, repo_name, output_dir):
+    """Create a brag doc summary markdown file."""
+    writer = BragDocWriter(repo_name, output_dir)
+    entries = [('authored', a) for a in authored_analyses] + [('reviewed', a) for a in reviewed_analyses]
+    for seq, (kind, analysis) in enumerate(entries):
+        writer.add(seq, kind, analysis['analysis'])
+    return writer.close()
 
 SELF_REFLECTION_PROMPT_FILE = os.path.join(os.path.dirname(__file__), '..', 'self_reflection_prompt.txt')
 
@@ -366,38 +1159,157 @@ def load_self_reflection_prompt_template():
             "- Format the document in markdown with clear headers, bullet points, and links to PRs where appropriate.\n"
         )
 
-def generate_self_reflection(openai_client, brag_doc_path, output_dir, performance_criteria=""):
-    """Generate a self-reflection document that maps PR contributions to performance review criteria."""
+SELF_REFLECTION_SYSTEM_MESSAGE = "You are an expert at creating impressive, detailed self-reflection documents for performance reviews. You carefully analyze provided information to create compelling narratives that showcase specific contributions and their impact, organized by project. You follow instructions exactly and create substantive, impressive content."
+
+# Brag docs larger than this are summarized in chunks before the self-reflection request
+SELF_REFLECTION_MAX_PROMPT_TOKENS = 60000
+REFLECTION_CHUNK_TOKENS = 12000
+
+REFLECTION_CHUNK_SYSTEM_MESSAGE = "You condense brag document entries into dense, factual summaries that a later step turns into a performance self-reflection. Keep every PR link, concrete outcome and number; drop repetition and filler."
+
+REFLECTION_CHUNK_PROMPT = """Summarize the following brag document entries ({label}).
+Group related PRs by project or area of work. For each group, state what was done and why it mattered, keeping the PR links in markdown format and any concrete numbers.
+
+{entries}
+"""
+
+def reflection_entry(kind, pr_data, analysis):
+    """Describe one PR analysis for hierarchical self-reflection, grouped by kind and merge month."""
+    merged_at = pr_data.get('merged_at') or ''
+    return {
+        'kind': kind,
+        'month': merged_at[:7],
+        'sort_key': (merged_at, pr_data['number']),
+        'text': analysis,
+    }
+
+def brag_doc_entries(brag_doc_content):
+    """Split a brag doc into paragraph entries per section, for when PR-level entries are not available."""
+    entries = []
+    reviewed_heading = BRAG_DOC_SECTIONS['reviewed']
+    authored_part, _, reviewed_part = brag_doc_content.partition(reviewed_heading)
+    for kind, text in (('authored', authored_part), ('reviewed', reviewed_part)):
+        for i, paragraph in enumerate(text.split("\n\n")):
+            if paragraph.strip():
+                entries.append({'kind': kind, 'month': '', 'sort_key': (i,), 'text': paragraph.strip()})
+    return entries
+
+def pack_chunks(texts, max_tokens):
+    """Pack texts, in order, into lists whose combined token count stays within max_tokens."""
+    chunks = []
+    current, size = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if current and size + tokens > max_tokens:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(text)
+        size += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+def chunk_reflection_entries(entries, max_tokens=REFLECTION_CHUNK_TOKENS):
+    """
+    Group entries by kind and merge month and split groups larger than
+    max_tokens. Returns (label, texts) chunks. Chunks only depend on their
+    own entries, so adding a PR changes only the chunk it falls into.
+    """
+    groups = {}
+    for entry in entries:
+        groups.setdefault((entry['kind'], entry['month']), []).append(entry)
+    
+    chunks = []
+    for kind, month in sorted(groups):
+        label = f"PRs {kind}" + (f", merged {month}" if month else "")
+        group = sorted(groups[(kind, month)], key=lambda entry: entry['sort_key'])
+        parts = pack_chunks([f"- {entry['text']}" for entry in group], max_tokens)
+        for i, texts in enumerate(parts):
+            chunks.append((label if len(parts) == 1 else f"{label} (part {i + 1})", texts))
+    return chunks
+
+def summarize_chunks(openai_client, chunks, rate_limiter=None, cache=None):
+    """Summarize (label, texts) chunks concurrently. Returns (label, summary) pairs in chunk order."""
+    def summarize(chunk):
+        label, texts = chunk
+        prompt = REFLECTION_CHUNK_PROMPT.format(label=label, entries="\n\n".join(texts))
+        return label, create_chat_completion(openai_client, REFLECTION_CHUNK_SYSTEM_MESSAGE, prompt,
+                                             rate_limiter=rate_limiter, cache=cache)
+    
+    with ThreadPoolExecutor(max_workers=llm_concurrency()) as executor:
+        return list(executor.map(summarize, chunks))
+
+@timed("summarize_brag_doc")
+def summarize_brag_doc(openai_client, entries, rate_limiter=None, cache=None,
+                       max_tokens=SELF_REFLECTION_MAX_PROMPT_TOKENS, chunk_tokens=REFLECTION_CHUNK_TOKENS):
+    """
+    Map-reduce a brag doc into content that fits the self-reflection prompt:
+    summarize chunks of entries, then summarize groups of summaries until the
+    result fits in max_tokens. Summaries too large to pack together are
+    summarized in pairs, and a single summary still over max_tokens is
+    truncated. Summaries go through the response cache, so only chunks whose
+    entries changed are summarized again.
+    """
+    chunks = chunk_reflection_entries(entries, chunk_tokens)
+    print(f"Summarizing {len(entries)} brag doc entries in {len(chunks)} chunks...")
+    sections = [f"### {label}\n\n{summary}" for label, summary in summarize_chunks(openai_client, chunks, rate_limiter, cache)]
+    
+    level = 1
+    while count_tokens("\n\n".join(sections)) > max_tokens and len(sections) > 1:
+        level += 1
+        chunks = [(f"summaries, level {level} part {i + 1}", texts)
+                  for i, texts in enumerate(pack_chunks(sections, chunk_tokens))]
+        if len(chunks) >= len(sections):
+            chunks = [(f"summaries, level {level} part {i + 1}", sections[start:start + 2])
+                      for i, start in enumerate(range(0, len(sections), 2))]
+        print(f"Condensing {len(sections)} summaries into {len(chunks)}...")
+        sections = [summary for _, summary in summarize_chunks(openai_client, chunks, rate_limiter, cache)]
+    
+    content = "\n\n".join(sections)
+    if count_tokens(content) > max_tokens:
+        print(f"Brag doc summary is still over {max_tokens} tokens; truncating it")
+        content = truncate_to_tokens(content, max_tokens)
+    return content
+
+REFLECTION_MODES = ('auto', 'single', 'hierarchical')
+
+@timed("self_reflection")
+def generate_self_reflection(openai_client, brag_doc_path, output_dir, performance_criteria="", rate_limiter=None, cache=None,
+                             entries=None, mode='auto'):
+    """
+    Generate a self-reflection document that maps PR contributions to performance review criteria.
+    In 'hierarchical' mode, or in 'auto' mode when the brag doc does not fit
+    the prompt budget, the brag doc is first condensed with summarize_brag_doc.
+    entries (from reflection_entry) lets chunks follow merge months; without
+    them the brag doc is split into paragraphs.
+    """
     print("Generating self-reflection document based on PR contributions...")
 
     # Read the brag doc summary
     with open(brag_doc_path, 'r', encoding='utf-8') as f:
         brag_doc_content = f.read()
 
-    # Load self-reflection prompt template
-    prompt_template = load_self_reflection_prompt_template()
-    prompt = prompt_template.format(
-        brag_doc_content=brag_doc_content,
-        performance_criteria=performance_criteria or "(Add your organization's performance review criteria here)"
-    )
-
     try:
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are an expert at creating impressive, detailed self-reflection documents for performance reviews. You carefully analyze provided information to create compelling narratives that showcase specific contributions and their impact, organized by project. You follow instructions exactly and create substantive, impressive content."},
-                {"role": "user", "content": prompt}
-            ]
+        if mode == 'hierarchical' or (mode == 'auto' and count_tokens(brag_doc_content) > SELF_REFLECTION_MAX_PROMPT_TOKENS):
+            if entries is None:
+                entries = brag_doc_entries(brag_doc_content)
+            brag_doc_content = summarize_brag_doc(openai_client, entries, rate_limiter=rate_limiter, cache=cache)
+
+        # Load self-reflection prompt template
+        prompt_template = load_self_reflection_prompt_template()
+        prompt = prompt_template.format(
+            brag_doc_content=brag_doc_content,
+            performance_criteria=performance_criteria or "(Add your organization's performance review criteria here)"
         )
-        reflection = response.choices[0].message.content
+
+        reflection = create_chat_completion(openai_client, SELF_REFLECTION_SYSTEM_MESSAGE, prompt, rate_limiter=rate_limiter, cache=cache)
 
         # Write to file
         today = datetime.datetime.now().strftime('%Y-%m-%d')
         filename = f"Self_Reflection_Performance_Review_{today}.md"
         filepath = os.path.join(output_dir, filename)
 
-        with open(filepath, 'w', encoding='utf-8') as f:
-            f.write(reflection)
+        write_file_atomic(filepath, reflection)
 
         print(f"Self-reflection document created: {filepath}")
         return filepath
@@ -405,95 +1317,642 @@ def generate_self_reflection(openai_client, brag_doc_path, output_dir, performan
         print(f"Error generating self-reflection: {e}")
         return None
 
-# Main execution
-def main():
-    print("Starting PR Impact Analysis...")
+def iter_repository_work(store, repo_name, user, start_date, end_date, scanned, fetch_errors):
+    """
+    Yield (kind, record) for every PR to report on: the (kind, pr) pairs from
+    the scan as they are fetched, then the stored PRs the scan did not return.
+    A failed scan is recorded in fetch_errors and the stored PRs are still
+    yielded, so their analyses are saved for the retry.
+    """
+    seen = set()
+    try:
+        for kind, pr in scanned:
+            seen.add((kind, pr['number']))
+            yield kind, store.load_pr(repo_name, user, kind, pr['number'])
+    except Exception as e:
+        fetch_errors.append(str(e))
+        print(f"[{repo_name}] Error fetching PRs: {e}")
     
-    # Initialize clients
-    github_client = initialize_github_client()
-    openai_client = initialize_openai_client()
+    for kind in ('authored', 'reviewed'):
+        for record in store.load_prs(repo_name, user, kind, start_date, end_date):
+            if (kind, record['pr_data']['number']) not in seen:
+                yield kind, record
+
+def repository_output_dir(repo_name, author):
+    """Name of today's output directory for a repository and author."""
+    today = datetime.datetime.now().strftime('%Y-%m-%d')
+    return f"PR_Analysis_{repo_name.replace('/', '_')}_{author}_{today}"
+
+def process_repository(repo_name, author, start_date, end_date, graphql_client, openai_client, store,
+                       rate_limiter=None, cache=None, full_refresh=False, refresh=False, reflection_mode='auto',
+                       scanned=None, fetch_error=None, batch=False, journal=None, reflect=True):
+    """
+    Fetch, analyze, summarize and reflect on one repository. Fetching,
+    analysis and file writing overlap: PRs are analyzed while later search
+    pages are still downloading, and each result is written as soon as it
+    completes. Returns a dict describing the outcome for the run summary.
+    scanned replaces the fetch with (kind, pr) pairs that are already in the
+    store, as in team mode; fetch_error reports a failure of that fetch.
+    With batch, the fetch completes first and the analyses are submitted
+    through the OpenAI Batch API before any files are written.
+    With refresh, stored analyses are ignored and replaced by new ones.
+    Progress is recorded in the run journal when one is given. In a resumed
+    run, a finished scan is not repeated and PR files already written are kept.
+    Failed analyses are left out of the outputs and retried by the next run.
+    When fetching fails, no brag doc or self-reflection is written and the
+    repository is reported as failed.
+    Without reflect, the self-reflection is left to the reflect subcommand.
+    """
+    if journal and journal.has(repo_name, author, 'completed'):
+        print(f"\n[{repo_name}] Already completed for {author} in this run; skipping.")
+        return {'repo': repo_name, 'status': 'resumed'}
+    print(f"\n[{repo_name}] Analyzing repository: {repo_name}")
     
-    # Comment out Google Drive client initialization
-    # drive_service, docs_service = initialize_google_drive_client()
+    # Create output directory for this repository
+    output_dir = create_output_directory(repository_output_dir(repo_name, author))
     
-    # Read repository and author information from environment variables
-    repo_names_str = os.getenv("GITHUB_REPO_NAMES", os.getenv("GITHUB_REPO_NAME", ""))
-    author = os.getenv("GITHUB_AUTHOR", "")
+    fetch_errors = [fetch_error] if fetch_error else []
+    counts = {'authored': 0, 'reviewed': 0, 'failed': 0}
+    # The brag doc file is only created once a successful analysis is added
+    brag_doc = BragDocWriter(repo_name, output_dir, start_date, end_date)
+    reflection_entries = []
     
-    if not author:
-        print("GITHUB_AUTHOR not found in environment variables. Please specify your GitHub username in the .env file.")
-        return
+    def analyze(work):
+        kind, record = work
+        # In batch mode the records were already refreshed in place
+        analysis = analyze_stored_pr(openai_client, store, repo_name, author, kind, record,
+                                     rate_limiter=rate_limiter, cache=cache, refresh=refresh and not batch)
+        if journal:
+            number = record['pr_data']['number']
+            if is_failed_analysis(analysis):
+                journal.record(repo_name, author, 'failed', kind, number, analysis)
+            else:
+                journal.record(repo_name, author, 'analyzed', kind, number)
+                journal.forget(repo_name, author, 'failed', kind, number)
+        return analysis
+    
+    def write(seq, work, analysis):
+        kind, record = work
+        if is_failed_analysis(analysis):
+            # Failed analyses are not written anywhere and are retried by the next run
+            brag_doc.add(seq, kind, None)
+            counts['failed'] += 1
+            return
+        
+        pr = record['pr_data']
+        written_path = journal.get(repo_name, author, 'written', kind, pr['number']) if journal else None
+        if not (written_path and os.path.exists(written_path)):
+            file_path = write_pr_analysis_to_file(pr, analysis, output_dir, record.get('analysis_meta'))
+            if journal:
+                journal.record(repo_name, author, 'written', kind, pr['number'], file_path)
+        brag_doc.add(seq, kind, analysis)
+        reflection_entries.append(reflection_entry(kind, pr, analysis))
+        counts[kind] += 1
+    
+    def journaled(scanned):
+        for kind, pr in scanned:
+            journal.record(repo_name, author, 'fetched', kind, pr['number'])
+            yield kind, pr
+        if not fetch_errors:
+            journal.record(repo_name, author, 'scanned')
+    
+    if scanned is None:
+        if journal and journal.has(repo_name, author, 'scanned'):
+            print(f"[{repo_name}] Scan already completed in this run; using stored PRs")
+            scanned = []
+        else:
+            scanned = iter_refreshed_prs(graphql_client, store, repo_name, author, start_date, end_date, full_refresh=full_refresh)
+    if journal:
+        scanned = journaled(scanned)
+    work = iter_repository_work(store, repo_name, author, start_date, end_date, scanned, fetch_errors)
+    if batch:
+        work = list(work)
+        analyze_records_in_batch(openai_client, store, repo_name, author, work, rate_limiter=rate_limiter, cache=cache, refresh=refresh)
+    try:
+        run_pipeline(work, analyze, write, workers=llm_concurrency())
+    except BaseException:
+        # A partial brag doc must not replace a complete one
+        brag_doc.discard()
+        raise
+    if fetch_errors:
+        # A brag doc missing the PRs the scan never reached must not replace a complete one
+        brag_doc.discard()
+        print(f"[{repo_name}] Fetching PRs failed; no brag doc or self-reflection was written.")
+        return {'repo': repo_name, 'status': 'failed',
+                'error': f"fetching PRs failed ({fetch_errors[0]}); rerun with --resume to retry"}
+    summary_path = brag_doc.close()
+    
+    if summary_path is None:
+        if counts['failed']:
+            print(f"[{repo_name}] All {counts['failed']} PR analyses failed; no brag doc or self-reflection was written.")
+            return {'repo': repo_name, 'status': 'failed',
+                    'error': f"all {counts['failed']} PR analyses failed; rerun to retry them"}
+        print(f"[{repo_name}] No relevant PRs found in the specified time range for repository {repo_name}. Skipping.")
+        return {'repo': repo_name, 'status': 'skipped'}
+    
+    print(f"\n[{repo_name}] Analysis complete for {repo_name}! Brag document and individual PR analyses have been stored in: {output_dir}")
+    print(f"[{repo_name}] Brag Doc summary: {summary_path}")
+    
+    reflection_path = None
+    if reflect:
+        reflection_path = generate_self_reflection(openai_client, summary_path, output_dir, rate_limiter=rate_limiter, cache=cache,
+                                                   entries=reflection_entries, mode=reflection_mode)
+        if reflection_path:
+            print(f"[{repo_name}] Self-reflection document: {reflection_path}")
+        else:
+            print(f"[{repo_name}] Failed to create self-reflection document.")
+    
+    if journal and not counts['failed'] and reflection_path:
+        journal.record(repo_name, author, 'completed')
+    
+    return {
+        'repo': repo_name,
+        'status': 'completed',
+        'authored': counts['authored'],
+        'reviewed': counts['reviewed'],
+        'failed': counts['failed'],
+        'output_dir': output_dir,
+        'brag_doc': summary_path,
+        'reflection_path': reflection_path,
+    }
+
+def run_repository(repo_name, **kwargs):
+    """Process one repository, reporting a failure instead of raising so other repositories keep going."""
+    try:
+        with span("repository", repo=repo_name, author=kwargs.get('author')):
+            return process_repository(repo_name, **kwargs)
+    except Exception as e:
+        print(f"[{repo_name}] Failed: {e}")
+        return {'repo': repo_name, 'status': 'failed', 'error': str(e)}
+
+def process_team_repository(repo_name, authors, start_date, end_date, graphql_client, openai_client, store,
+                            full_refresh=False, **kwargs):
+    """
+    Team mode: fetch one repository once for every author, then report on
+    each author from the shared index. Returns one result dict per author.
+    In a resumed run, authors whose scan already finished are not fetched again.
+    """
+    journal = kwargs.get('journal')
+    to_scan = [author for author in authors
+               if not (journal and (journal.has(repo_name, author, 'scanned') or journal.has(repo_name, author, 'completed')))]
+    index = {author: [] for author in authors}
+    fetch_error = None
+    if to_scan:
+        print(f"\n[{repo_name}] Fetching repository once for {len(to_scan)} authors")
+        try:
+            with span("team_fetch", repo=repo_name):
+                index.update(index_team_prs(graphql_client, store, repo_name, to_scan, start_date, end_date, full_refresh=full_refresh))
+        except Exception as e:
+            fetch_error = str(e)
+            print(f"[{repo_name}] Error fetching PRs: {e}")
+    
+    results = []
+    for author in authors:
+        result = run_repository(repo_name, author=author, start_date=start_date, end_date=end_date,
+                                graphql_client=graphql_client, openai_client=openai_client, store=store,
+                                scanned=index[author], fetch_error=fetch_error if author in to_scan else None, **kwargs)
+        result['author'] = author
+        results.append(result)
+    return results
+
+def run_team_repository(repo_name, authors, **kwargs):
+    """Team mode counterpart of run_repository."""
+    try:
+        return process_team_repository(repo_name, authors, **kwargs)
+    except Exception as e:
+        print(f"[{repo_name}] Failed: {e}")
+        return [{'repo': repo_name, 'author': author, 'status': 'failed', 'error': str(e)} for author in authors]
+
+def run_stored_repository(repo_name, authors, **kwargs):
+    """Report on each author of a repository from the PRs already in the store, without any GitHub requests."""
+    results = []
+    for author in authors:
+        result = run_repository(repo_name, author=author, scanned=[], **kwargs)
+        if len(authors) > 1:
+            result['author'] = author
+        results.append(result)
+    return results
+
+def iter_analyzed_records(store, repo_name, user, start_date, end_date, unanalyzed=None):
+    """
+    Yield (kind, record) for the stored PRs with a successful analysis,
+    authored first, newest merge first. The PRs skipped for having no
+    analysis are counted in the unanalyzed dict, by kind, when one is given.
+    """
+    for kind in ('authored', 'reviewed'):
+        for record in store.load_prs(repo_name, user, kind, start_date, end_date):
+            if not is_failed_analysis(record['analysis']):
+                yield kind, record
+            elif unanalyzed is not None:
+                unanalyzed[kind] = unanalyzed.get(kind, 0) + 1
+
+def summarize_repository(store, repo_name, author, start_date, end_date, label_author=False):
+    """
+    Rebuild the brag doc of a repository and author from the analyses in the
+    store, without calling GitHub or OpenAI. PRs that have not been analyzed
+    are left out and counted.
+    """
+    output_dir = create_output_directory(repository_output_dir(repo_name, author))
+    result = {'repo': repo_name, 'author': author} if label_author else {'repo': repo_name}
+    counts = {'authored': 0, 'reviewed': 0}
+    unanalyzed = {}
+    writer = BragDocWriter(repo_name, output_dir, start_date, end_date)
+    with span("summarize", repo=repo_name, author=author):
+        try:
+            for seq, (kind, record) in enumerate(iter_analyzed_records(store, repo_name, author, start_date, end_date, unanalyzed)):
+                writer.add(seq, kind, record['analysis'])
+                counts[kind] += 1
+        except BaseException:
+            writer.discard()
+            raise
+        brag_doc = writer.close()
+    if brag_doc is None:
+        print(f"[{repo_name}] No analyzed PRs stored for {author}; run the analyze subcommand first.")
+        return dict(result, status='skipped')
+    print(f"[{repo_name}] Brag Doc summary: {brag_doc}")
+    return dict(result, status='completed', authored=counts['authored'], reviewed=counts['reviewed'], failed=0,
+                unanalyzed=sum(unanalyzed.values()), output_dir=output_dir, brag_doc=brag_doc,
+                reflection_path=None)
+
+def print_run_summary(results):
+    print("\nRun summary:")
+    for result in results:
+        if result.get('author'):
+            result = dict(result, repo=f"{result['repo']} ({result['author']})")
+        if result['status'] == 'completed':
+            print(f"- {result['repo']}: {result['authored']} authored and {result['reviewed']} reviewed PRs in {result['output_dir']}")
+            if result['failed']:
+                print(f"  {result['failed']} PR analyses failed and were left out; rerun with --resume to retry them")
+            if result.get('unanalyzed'):
+                print(f"  {result['unanalyzed']} stored PRs have no analysis yet; run the analyze subcommand to add them")
+        elif result['status'] == 'fetched':
+            print(f"- {result['repo']}: {result['authored']} authored and {result['reviewed']} reviewed PRs fetched")
+        elif result['status'] == 'reflected':
+            print(f"- {result['repo']}: self-reflection in {result['reflection_path']}")
+        elif result['status'] == 'skipped':
+            print(f"- {result['repo']}: no relevant PRs")
+        elif result['status'] == 'resumed':
+            print(f"- {result['repo']}: completed earlier in this run")
+        else:
+            print(f"- {result['repo']}: FAILED ({result['error']})")
+
+DEFAULT_REPO_WORKERS = 4
+
+# Analysis window used unless --start-date/--end-date or PR_ANALYSES_START_DATE/PR_ANALYSES_END_DATE say otherwise
+DEFAULT_START_DATE = "2024-09-01"
+DEFAULT_END_DATE = "2025-04-01"
+
+COMMANDS = ('fetch', 'analyze', 'summarize', 'reflect', 'run')
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD command-line date."""
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid date {value!r}; use YYYY-MM-DD")
+
+def parse_args(argv=None):
+    """
+    Parse the command line. Without a subcommand, 'run' is assumed, so
+    existing invocations such as `pr_analyses.py --batch` keep working.
+    """
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if not argv or (argv[0] not in COMMANDS and argv[0] not in ('-h', '--help')):
+        argv = ['run'] + argv
+    
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--repos",
+                        help="Comma-separated repositories (owner/name); defaults to GITHUB_REPO_NAMES or GITHUB_REPO_NAME")
+    common.add_argument("--authors",
+                        help="Comma-separated GitHub logins to analyze (team mode); defaults to GITHUB_AUTHORS or GITHUB_AUTHOR")
+    common.add_argument("--start-date", type=parse_date,
+                        help=f"First day of the analysis window, YYYY-MM-DD (default: PR_ANALYSES_START_DATE or {DEFAULT_START_DATE})")
+    common.add_argument("--end-date", type=parse_date,
+                        help=f"End of the analysis window, YYYY-MM-DD, at midnight (default: PR_ANALYSES_END_DATE or {DEFAULT_END_DATE})")
+    common.add_argument("--repo-workers", type=int, default=DEFAULT_REPO_WORKERS,
+                        help="Number of repositories processed concurrently")
+    common.add_argument("--report",
+                        help="Path of the JSON run report (default: a new file in .pr_analyses_cache/reports)")
+    
+    llm = argparse.ArgumentParser(add_help=False)
+    llm.add_argument("--no-cache", action="store_true",
+                     help="Do not read or write the LLM response cache, and reanalyze PRs with stored analyses")
+    llm.add_argument("--refresh", action="store_true",
+                     help="Ignore cached LLM responses and stored analyses and store fresh ones")
+    
+    def add_full_refresh(parser):
+        parser.add_argument("--full-refresh", action="store_true",
+                            help="Rescan the whole date window instead of only PRs updated since the last run")
+    
+    def add_from_snapshot(parser):
+        parser.add_argument("--from-snapshot", metavar="PATH",
+                            help="Analyze the PRs in a snapshot written by --export-snapshot instead of fetching them from GitHub")
+    
+    def add_export_snapshot(parser):
+        parser.add_argument("--export-snapshot", metavar="PATH",
+                            help="Afterwards, write the fetched PRs to a gzip-compressed JSONL snapshot")
+    
+    def add_batch(parser):
+        parser.add_argument("--batch", action="store_true",
+                            help="Analyze PRs through the OpenAI Batch API instead of interactive requests")
+    
+    def add_reflection_mode(parser):
+        parser.add_argument("--reflection-mode", choices=REFLECTION_MODES, default='auto',
+                            help="Write the self-reflection from the whole brag doc (single), from chunk summaries "
+                                 "(hierarchical), or pick by brag doc size (auto)")
+    
+    parser = argparse.ArgumentParser(description="Generate PR impact analyses, a brag doc and a self-reflection document.")
+    subparsers = parser.add_subparsers(dest="command", metavar="COMMAND")
+    
+    fetch = subparsers.add_parser("fetch", parents=[common], help="Fetch PRs from GitHub into the local store (GitHub only)")
+    add_full_refresh(fetch)
+    add_export_snapshot(fetch)
+    
+    analyze = subparsers.add_parser("analyze", parents=[common, llm],
+                                    help="Analyze stored PRs and write the PR files and brag doc (OpenAI only)")
+    add_from_snapshot(analyze)
+    add_batch(analyze)
+    
+    subparsers.add_parser("summarize", parents=[common],
+                          help="Rebuild the brag doc from stored analyses (local only)")
+    
+    reflect = subparsers.add_parser("reflect", parents=[common, llm],
+                                    help="Write the self-reflection from stored analyses or a brag doc (OpenAI only)")
+    reflect.add_argument("--brag-doc", metavar="PATH",
+                         help="Reflect on an existing brag doc file instead of the stored analyses")
+    add_reflection_mode(reflect)
+    
+    run = subparsers.add_parser("run", parents=[common, llm], help="Fetch, analyze, summarize and reflect (default)")
+    add_full_refresh(run)
+    add_from_snapshot(run)
+    add_export_snapshot(run)
+    run.add_argument("--resume", action="store_true",
+                     help="Continue the last unfinished run with the same repositories, authors and dates")
+    add_batch(run)
+    add_reflection_mode(run)
+    
+    args = parser.parse_args(argv)
+    args.start_date = args.start_date or parse_date(os.getenv("PR_ANALYSES_START_DATE", DEFAULT_START_DATE))
+    args.end_date = args.end_date or parse_date(os.getenv("PR_ANALYSES_END_DATE", DEFAULT_END_DATE))
+    if args.start_date >= args.end_date:
+        parser.error("--start-date must be before --end-date")
+    return args
+
+def resolve_targets(args, snapshot=None):
+    """
+    Return (repo_names, authors) from the arguments or the environment; a
+    snapshot supplies its own by default. Returns None after explaining
+    what is missing.
+    """
+    repo_names_str = args.repos or os.getenv("GITHUB_REPO_NAMES", os.getenv("GITHUB_REPO_NAME", ""))
+    authors_str = args.authors or os.getenv("GITHUB_AUTHORS", os.getenv("GITHUB_AUTHOR", ""))
+    if snapshot:
+        repo_names_str = repo_names_str or ",".join(snapshot['repos'])
+        authors_str = authors_str or ",".join(snapshot['users'])
+    
+    # Several authors run in team mode: each repository is fetched once for all of them
+    authors = []
+    for login in authors_str.split(","):
+        if login.strip() and login.strip() not in authors:
+            authors.append(login.strip())
+    
+    if not authors:
+        print("GITHUB_AUTHOR not found in environment variables. Please specify your GitHub username in the .env file or with --authors.")
+        return None
     
     # Support multiple repositories by splitting the comma-separated string
     repo_names = [repo.strip() for repo in repo_names_str.split(",") if repo.strip()]
     
     if not repo_names:
-        print("No repository names found. Please specify at least one repository in the .env file using GITHUB_REPO_NAMES or GITHUB_REPO_NAME.")
+        print("No repository names found. Please specify at least one repository in the .env file using GITHUB_REPO_NAMES or GITHUB_REPO_NAME, or with --repos.")
+        return None
+    return repo_names, authors
+
+def open_snapshot(args):
+    """Read the header of --from-snapshot. Returns (True, header or None), or (False, None) if it cannot be read."""
+    if not getattr(args, 'from_snapshot', None):
+        return True, None
+    try:
+        snapshot = read_snapshot_header(args.from_snapshot)
+    except Exception as e:
+        print(f"Cannot read snapshot {args.from_snapshot}: {e}")
+        return False, None
+    print(f"Analyzing PRs from snapshot {args.from_snapshot} (created {snapshot['created_at']}); GitHub will not be contacted")
+    return True, snapshot
+
+def map_repositories(args, repo_names, process):
+    """Run process(repo_name), which returns a list of results, for every repository concurrently."""
+    with ThreadPoolExecutor(max_workers=max(1, args.repo_workers)) as executor:
+        return [result for repo_results in executor.map(process, repo_names) for result in repo_results]
+
+def finish_command(args, results, run_id=None, github_rate_limiter=None, cache=None):
+    """Print the run summaries and write the JSON run report."""
+    metrics = get_metrics()
+    if github_rate_limiter:
+        print(github_rate_limiter.summary())
+    if cache:
+        print(cache.summary())
+        cache.close()
+    
+    print(metrics.summary())
+    report = metrics.report(
+        run_id=run_id,
+        command=args.command,
+        args=vars(args),
+        results=results,
+        github_stages=github_rate_limiter.stages if github_rate_limiter else None,
+        llm_cache={'hits': cache.hits, 'misses': cache.misses} if cache else None,
+    )
+    report_name = f"{args.command}_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    report_path = args.report or os.path.join(DEFAULT_REPORT_DIR, f"{report_name}_{run_id}.json" if run_id else f"{report_name}.json")
+    try:
+        write_report(report, report_path)
+        print(f"Run report written to {report_path}")
+    except Exception as e:
+        print(f"Error writing run report {report_path}: {e}")
+
+def export_requested_snapshot(args, store, repo_names, authors):
+    if args.export_snapshot:
+        try:
+            export_snapshot(store, args.export_snapshot, repo_names, authors, args.start_date, args.end_date)
+        except Exception as e:
+            print(f"Error exporting snapshot {args.export_snapshot}: {e}")
+
+def fetch_command(args):
+    """Fetch the PRs of every author into the store, one scan per repository."""
+    targets = resolve_targets(args)
+    if not targets:
         return
+    repo_names, authors = targets
+    github_rate_limiter = initialize_github_rate_limiter()
+    graphql_client = initialize_graphql_client(rate_limiter=github_rate_limiter)
+    store = initialize_pr_store()
     
-    # Define specific date range (September 2024 to March 26, 2025)
-    start_date = datetime.datetime(2024, 9, 1)  # September 1, 2024
-    end_date = datetime.datetime(2025, 4, 1)   # april 1, 2025
+    def fetch(repo_name):
+        counts = {(author, kind): 0 for author in authors for kind in ('authored', 'reviewed')}
+        print(f"\n[{repo_name}] Fetching PRs")
+        try:
+            with span("fetch", repo=repo_name):
+                for author, kind, _ in iter_refreshed_team_prs(graphql_client, store, repo_name, authors,
+                                                                args.start_date, args.end_date, full_refresh=args.full_refresh):
+                    counts[(author, kind)] += 1
+        except Exception as e:
+            print(f"[{repo_name}] Error fetching PRs: {e}")
+            return [{'repo': repo_name, 'author': author, 'status': 'failed', 'error': str(e)} for author in authors]
+        return [{'repo': repo_name, 'author': author, 'status': 'fetched',
+                 'authored': counts[(author, 'authored')], 'reviewed': counts[(author, 'reviewed')]} for author in authors]
     
-    for repo_name in repo_names:
-        print(f"\nAnalyzing repository: {repo_name}")
-        
-        # Create output directory for this repository
-        today = datetime.datetime.now().strftime('%Y-%m-%d')
-        output_dir = create_output_directory(f"PR_Analysis_{repo_name.replace('/', '_')}_{author}_{today}")
-        
-        # Fetch and analyze PRs you authored
-        authored_prs = fetch_prs(github_client, repo_name, start_date=start_date, end_date=end_date, 
-                                author=author, merged_only=True)
-        
-        # Fetch and analyze PRs you reviewed
-        reviewed_prs = fetch_prs_reviewed(github_client, repo_name, start_date=start_date, 
-                                         end_date=end_date, reviewer=author)
-        
-        if not authored_prs and not reviewed_prs:
-            print(f"No relevant PRs found in the specified time range for repository {repo_name}. Skipping.")
-            continue
-        
-        # Analyze PRs and store results
-        authored_analyses = []
-        reviewed_analyses = []
-        
-        # Analyze authored PRs
-        for pr in authored_prs:
-            analysis = analyze_pr_impact(openai_client, pr, is_authored=True)
-            file_path = write_pr_analysis_to_file(pr, analysis, output_dir)
-            
-            authored_analyses.append({
-                'pr_data': pr,
-                'analysis': analysis,
-                'file_path': file_path
-            })
-            time.sleep(1)
-        
-        # Analyze reviewed PRs
-        for pr in reviewed_prs:
-            analysis = analyze_pr_impact(openai_client, pr, is_authored=False)
-            file_path = write_pr_analysis_to_file(pr, analysis, output_dir)
-            
-            reviewed_analyses.append({
-                'pr_data': pr,
-                'analysis': analysis,
-                'file_path': file_path
-            })
-            time.sleep(1)
-        
-        # Create brag doc summary
-        summary_path = create_brag_doc_summary(authored_analyses, reviewed_analyses, repo_name, output_dir)
+    results = map_repositories(args, repo_names, fetch)
+    print_run_summary(results)
+    export_requested_snapshot(args, store, repo_names, authors)
+    store.close()
+    finish_command(args, results, github_rate_limiter=github_rate_limiter)
+
+def analyze_command(args):
+    """Analyze the stored (or snapshot) PRs and write the PR files and brag docs, without GitHub requests."""
+    ok, snapshot = open_snapshot(args)
+    targets = ok and resolve_targets(args, snapshot)
+    if not targets:
+        return
+    repo_names, authors = targets
+    openai_client = initialize_openai_client()
+    rate_limiter = initialize_llm_rate_limiter()
+    cache = initialize_response_cache(no_cache=args.no_cache, refresh=args.refresh)
+    store, close_store = open_pr_store(args, repo_names, authors)
+    
+    options = dict(
+        start_date=args.start_date, end_date=args.end_date,
+        graphql_client=None, openai_client=openai_client, store=store,
+        rate_limiter=rate_limiter, cache=cache, refresh=args.refresh or args.no_cache, batch=args.batch, reflect=False
+    )
+    results = map_repositories(args, repo_names, lambda repo_name: run_stored_repository(repo_name, authors, **options))
+    print_run_summary(results)
+    close_store()
+    finish_command(args, results, cache=cache)
+
+def summarize_command(args):
+    """Rebuild the brag docs from the stored analyses; neither GitHub nor OpenAI is used."""
+    targets = resolve_targets(args)
+    if not targets:
+        return
+    repo_names, authors = targets
+    store = initialize_pr_store()
+    results = map_repositories(args, repo_names, lambda repo_name: [
+        summarize_repository(store, repo_name, author, args.start_date, args.end_date, label_author=len(authors) > 1)
+        for author in authors
+    ])
+    print_run_summary(results)
+    store.close()
+    finish_command(args, results)
+
+def reflect_command(args):
+    """Write the self-reflection from a brag doc file, or from the stored analyses of each repository and author."""
+    openai_client = initialize_openai_client()
+    rate_limiter = initialize_llm_rate_limiter()
+    cache = initialize_response_cache(no_cache=args.no_cache, refresh=args.refresh)
+    
+    if args.brag_doc:
+        reflection_path = generate_self_reflection(openai_client, args.brag_doc, os.path.dirname(args.brag_doc) or ".",
+                                                   rate_limiter=rate_limiter, cache=cache, mode=args.reflection_mode)
+        results = [{'repo': args.brag_doc, 'status': 'reflected', 'reflection_path': reflection_path}]
+    else:
+        targets = resolve_targets(args)
+        if not targets:
+            return
+        repo_names, authors = targets
+        store = initialize_pr_store()
         
-        print(f"\nAnalysis complete for {repo_name}! Brag document and individual PR analyses have been stored in: {output_dir}")
-        print(f"Brag Doc summary: {summary_path}")
+        def reflect(repo_name):
+            results = []
+            for author in authors:
+                result = summarize_repository(store, repo_name, author, args.start_date, args.end_date, label_author=len(authors) > 1)
+                if result['status'] == 'completed':
+                    entries = [reflection_entry(kind, record['pr_data'], record['analysis'])
+                               for kind, record in iter_analyzed_records(store, repo_name, author, args.start_date, args.end_date)]
+                    reflection_path = generate_self_reflection(openai_client, result['brag_doc'], result['output_dir'],
+                                                               rate_limiter=rate_limiter, cache=cache,
+                                                               entries=entries, mode=args.reflection_mode)
+                    result = dict(result, status='reflected' if reflection_path else 'failed', reflection_path=reflection_path,
+                                  error=None if reflection_path else "the self-reflection could not be generated")
+                results.append(result)
+            return results
         
-        if summary_path:
-            reflection_path = generate_self_reflection(openai_client, summary_path, output_dir)
-            if reflection_path:
-                print(f"Self-reflection document: {reflection_path}")
-            else:
-                print("Failed to create self-reflection document.")
+        results = map_repositories(args, repo_names, reflect)
+        store.close()
+    print_run_summary(results)
+    finish_command(args, results, cache=cache)
+
+def run_command(args):
+    """Fetch, analyze, summarize and reflect on every repository; the full pipeline."""
+    ok, snapshot = open_snapshot(args)
+    targets = ok and resolve_targets(args, snapshot)
+    if not targets:
+        return
+    repo_names, authors = targets
+    start_date, end_date = args.start_date, args.end_date
+    
+    # Initialize clients; rate budgets are shared by every repository worker
+    github_rate_limiter = initialize_github_rate_limiter()
+    graphql_client = None if snapshot else initialize_graphql_client(rate_limiter=github_rate_limiter)
+    openai_client = initialize_openai_client()
+    rate_limiter = initialize_llm_rate_limiter()
+    
+    # Comment out Google Drive client initialization
+    # drive_service, docs_service = initialize_google_drive_client()
+    
+    cache = initialize_response_cache(no_cache=args.no_cache, refresh=args.refresh)
+    store, close_store = open_pr_store(args, repo_names, authors)
+    journal = initialize_run_journal()
+    run_config = {
+        'repos': repo_names,
+        'authors': authors,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+    }
+    if snapshot:
+        run_config['snapshot'] = os.path.abspath(args.from_snapshot)
+    journal.start_run(run_config, resume=args.resume)
+    
+    options = dict(
+        start_date=start_date, end_date=end_date,
+        graphql_client=graphql_client, openai_client=openai_client, store=store,
+        rate_limiter=rate_limiter, cache=cache, full_refresh=args.full_refresh, refresh=args.refresh or args.no_cache,
+        reflection_mode=args.reflection_mode, batch=args.batch, journal=journal
+    )
+    if snapshot:
+        results = map_repositories(args, repo_names, lambda repo_name: run_stored_repository(repo_name, authors, **options))
+    elif len(authors) == 1:
+        results = map_repositories(args, repo_names,
+                                   lambda repo_name: [run_repository(repo_name, author=authors[0], **options)])
+    else:
+        results = map_repositories(args, repo_names, lambda repo_name: run_team_repository(repo_name, authors, **options))
+    print_run_summary(results)
+    
+    # Leave the run open for --resume while anything is left to retry
+    if all(result['status'] in ('completed', 'skipped', 'resumed') and not result.get('failed')
+           for result in results):
+        journal.finish_run()
+    else:
+        print(f"Run {journal.run_id} is incomplete; rerun with --resume to retry the remaining work.")
+    export_requested_snapshot(args, store, repo_names, authors)
+    journal.close()
+    close_store()
+    finish_command(args, results, run_id=journal.run_id, github_rate_limiter=github_rate_limiter, cache=cache)
+
+COMMAND_HANDLERS = {
+    'fetch': fetch_command,
+    'analyze': analyze_command,
+    'summarize': summarize_command,
+    'reflect': reflect_command,
+    'run': run_command,
+}
+
+# Main execution
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Starting PR Impact Analysis ({args.command}, {args.start_date.strftime('%Y-%m-%d')} to {args.end_date.strftime('%Y-%m-%d')})...")
+    start_run_metrics()
+    COMMAND_HANDLERS[args.command](args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+"""
+Portable snapshots of fetched PR records.
+
+A snapshot is a gzip-compressed JSONL file. The first line is a header with
+the format version and the repositories, users and date range it covers.
+Every following line is one PR record: the repository, the user it was
+fetched for, its kind ("authored" or "reviewed") and the PR data, including
+review bodies and change stats. Records are written and read one line at a
+time, so snapshots of any size are streamed rather than loaded whole.
+
+Snapshots let the analysis run again, for example with a changed prompt or
+in CI, without any GitHub requests.
+"""
+import datetime
+import gzip
+import json
+import os
+
+SNAPSHOT_FORMAT = "pr_analyses_snapshot"
+SNAPSHOT_VERSION = 1
+
+
+def write_snapshot(path, records, repos, users, start_date, end_date):
+    """
+    Write records ((repo, user, kind, pr) tuples, any iterable) to a snapshot
+    at path, replacing any existing file atomically. Returns the number of
+    records written.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "created_at": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "repos": list(repos),
+        "users": list(users),
+        "start_date": start_date.strftime("%Y-%m-%d"),
+        "end_date": end_date.strftime("%Y-%m-%d"),
+    }
+    count = 0
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        f.write(json.dumps(header, separators=(",", ":")) + "\n")
+        for repo, user, kind, pr in records:
+            f.write(json.dumps({"repo": repo, "user": user, "kind": kind, "pr": pr}, separators=(",", ":")) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def read_snapshot_header(path):
+    """Return the header of a snapshot, raising ValueError if the file is not one."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        line = f.readline()
+    try:
+        header = json.loads(line)
+    except ValueError:
+        header = None
+    if not isinstance(header, dict) or header.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"{path} is not a PR snapshot")
+    if header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"{path} has snapshot version {header.get('version')}; only version {SNAPSHOT_VERSION} is supported")
+    return header
+
+
+def iter_snapshot(path, repo=None, user=None):
+    """
+    Yield (repo, user, kind, pr) for the records of a snapshot, optionally
+    only those of one repository and user, reading one line at a time.
+    """
+    read_snapshot_header(path)
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if (repo is None or record["repo"] == repo) and (user is None or record["user"] == user):
+                yield record["repo"], record["user"], record["kind"], record["pr"]
@@ -0,0 +1,146 @@
+"""
+Local store of fetched PR records and their analyses.
+
+Records are kept per repository, per user the run is for, and per kind
+("authored" or "reviewed"). A watermark per repository and user remembers
+when the repository was last scanned and which merge window that scan
+covered, so later runs only need to fetch PRs updated since then.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+DEFAULT_STORE_PATH = os.path.join(".pr_analyses_cache", "pr_store.sqlite")
+
+_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _format_datetime(value):
+    return value.strftime(_DATETIME_FORMAT)
+
+
+def _parse_datetime(value):
+    return datetime.datetime.strptime(value, _DATETIME_FORMAT)
+
+
+def _record(data, analysis, fingerprint, meta):
+    return {
+        'pr_data': json.loads(data),
+        'analysis': analysis,
+        'analysis_fingerprint': fingerprint,
+        'analysis_meta': json.loads(meta) if meta else None,
+    }
+
+
+class PRStore:
+    """SQLite-backed PR record store shared by worker threads."""
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS prs ("
+            " repo TEXT NOT NULL,"
+            " user TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " number INTEGER NOT NULL,"
+            " merged_at TEXT,"
+            " data TEXT NOT NULL,"
+            " analysis TEXT,"
+            " analysis_fingerprint TEXT,"
+            " analysis_meta TEXT,"
+            " PRIMARY KEY (repo, user, kind, number));"
+            "CREATE TABLE IF NOT EXISTS watermarks ("
+            " repo TEXT NOT NULL,"
+            " user TEXT NOT NULL,"
+            " updated_since TEXT NOT NULL,"
+            " window_start TEXT NOT NULL,"
+            " window_end TEXT NOT NULL,"
+            " PRIMARY KEY (repo, user));"
+        )
+        # Stores created before analysis metadata was kept lack the column
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(prs)")]
+        if "analysis_meta" not in columns:
+            self._db.execute("ALTER TABLE prs ADD COLUMN analysis_meta TEXT")
+        self._db.commit()
+
+    def get_watermark(self, repo, user):
+        """Return the last scan's watermark as a dict of datetimes, or None if the repository was never scanned."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT updated_since, window_start, window_end FROM watermarks WHERE repo = ? AND user = ?",
+                (repo, user)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            'updated_since': _parse_datetime(row[0]),
+            'window_start': _parse_datetime(row[1]),
+            'window_end': _parse_datetime(row[2]),
+        }
+
+    def set_watermark(self, repo, user, updated_since, window_start, window_end):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO watermarks (repo, user, updated_since, window_start, window_end)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (repo, user, _format_datetime(updated_since), _format_datetime(window_start), _format_datetime(window_end))
+            )
+            self._db.commit()
+
+    def upsert_prs(self, repo, user, kind, prs):
+        """Insert or update PR records, keeping any stored analysis."""
+        with self._lock:
+            self._db.executemany(
+                "INSERT INTO prs (repo, user, kind, number, merged_at, data) VALUES (?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT (repo, user, kind, number) DO UPDATE SET merged_at = excluded.merged_at, data = excluded.data",
+                [(repo, user, kind, pr['number'], pr.get('merged_at'), json.dumps(pr)) for pr in prs]
+            )
+            self._db.commit()
+
+    def load_prs(self, repo, user, kind, start_date, end_date):
+        """
+        Return stored records of a kind merged on or after start_date and
+        before end_date, newest merge first. Each record has 'pr_data', 'analysis', 'analysis_fingerprint'
+        and 'analysis_meta' (the prompt metadata of the analysis, or None).
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data, analysis, analysis_fingerprint, analysis_meta FROM prs"
+                " WHERE repo = ? AND user = ? AND kind = ? AND merged_at >= ? AND merged_at < ?"
+                " ORDER BY merged_at DESC, number DESC",
+                (repo, user, kind, start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+            ).fetchall()
+        return [_record(*row) for row in rows]
+
+    def load_pr(self, repo, user, kind, number):
+        """Return the stored record for one PR, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, analysis, analysis_fingerprint, analysis_meta FROM prs"
+                " WHERE repo = ? AND user = ? AND kind = ? AND number = ?",
+                (repo, user, kind, number)
+            ).fetchone()
+        if row is None:
+            return None
+        return _record(*row)
+
+    def save_analysis(self, repo, user, kind, number, analysis, analysis_fingerprint, analysis_meta=None):
+        with self._lock:
+            self._db.execute(
+                "UPDATE prs SET analysis = ?, analysis_fingerprint = ?, analysis_meta = ?"
+                " WHERE repo = ? AND user = ? AND kind = ? AND number = ?",
+                (analysis, analysis_fingerprint, json.dumps(analysis_meta) if analysis_meta else None,
+                 repo, user, kind, number)
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,290 @@
+"""
+Client-side rate limiting and retry helpers for API calls made from worker threads.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Holds up to `capacity` tokens and refills at
+    `rate` tokens per second; acquire() blocks until enough tokens are available.
+    """
+
+    def __init__(self, capacity, rate):
+        self.capacity = capacity
+        self.rate = rate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        """Take `amount` tokens, sleeping until they are available. Returns seconds waited."""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return waited
+                delay = (amount - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def adjust(self, amount):
+        """Return (positive) or charge (negative) tokens after the real cost is known."""
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget shared by all callers,
+    optionally with a cap on the number of requests in flight at once.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute=None, max_concurrency=None):
+        self.requests = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self.tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0) if tokens_per_minute else None
+        self._in_flight = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+
+    @contextmanager
+    def in_flight(self):
+        """Hold one of the concurrent request slots for the duration of a request."""
+        if self._in_flight is None:
+            yield
+            return
+        with self._in_flight:
+            yield
+
+    def acquire(self, estimated_tokens=0, priority=0, stage=None):
+        """
+        Block until one request and `estimated_tokens` tokens fit in the budget.
+        priority and stage are only used by GitHubRateScheduler.
+        """
+        waited = self.requests.acquire(1)
+        if self.tokens and estimated_tokens:
+            waited += self.tokens.acquire(estimated_tokens)
+        return waited
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Correct the token budget once the real token usage of a request is known."""
+        if self.tokens and actual_tokens is not None:
+            self.tokens.adjust(estimated_tokens - actual_tokens)
+
+
+# GitHub calls that list PRs are scheduled ahead of per-PR detail calls
+PRIORITY_LISTING = 0
+PRIORITY_DETAIL = 1
+
+# Requests per resource kept back for listing calls once the budget runs low
+DEFAULT_DETAIL_RESERVE = 50
+# Below this fraction of the limit, requests are spread over the time left until reset
+PACING_FRACTION = 0.2
+# Extra wait after a reset time, to allow for clock skew with GitHub
+RESET_MARGIN = 1.0
+
+
+def header_value(headers, name):
+    """Case-insensitive header lookup over a dict or a list of (name, value) pairs."""
+    items = headers.items() if hasattr(headers, "items") else headers
+    name = name.lower()
+    for key, value in items:
+        if key.lower() == name:
+            return value
+    return None
+
+
+class GitHubRateScheduler(RateLimiter):
+    """
+    Schedules GitHub requests against the budgets GitHub reports.
+
+    observe() reads X-RateLimit-Limit / -Remaining / -Reset / -Resource from
+    every response and Retry-After from secondary rate limits. acquire()
+    then paces requests for that resource over the time left until reset
+    once the budget runs low. It sleeps until the reset when the budget is
+    gone, and lets listing calls go ahead of waiting detail calls. The last
+    `detail_reserve` requests are kept for listing calls. Stages are labelled
+    "resource:name" (for example "graphql:search"), and per-stage requests
+    and waits are kept for the run summary.
+    """
+
+    def __init__(self, requests_per_minute, max_concurrency=None, detail_reserve=DEFAULT_DETAIL_RESERVE):
+        super().__init__(requests_per_minute, max_concurrency=max_concurrency)
+        self.detail_reserve = detail_reserve
+        self._cond = threading.Condition()
+        self._tickets = itertools.count()
+        self._waiting = {}
+        self._budgets = {}
+        self._last_grant = {}
+        self._paused_until = 0.0
+        self.stages = {}
+
+    def _delay(self, resource, priority):
+        """Seconds a request of this priority must still wait, or 0."""
+        now = time.time()
+        if now < self._paused_until:
+            return self._paused_until - now
+        budget = self._budgets.get(resource)
+        if budget is None or budget["reset"] <= now:
+            return 0
+        floor = 0 if priority == PRIORITY_LISTING else min(self.detail_reserve, budget["limit"] // 10)
+        if budget["remaining"] <= floor:
+            return budget["reset"] - now + RESET_MARGIN
+        if budget["remaining"] < budget["limit"] * PACING_FRACTION:
+            spacing = (budget["reset"] - now) / (budget["remaining"] - floor)
+            return max(0, self._last_grant.get(resource, 0) + spacing - now)
+        return 0
+
+    def acquire(self, estimated_tokens=0, priority=PRIORITY_LISTING, stage="core:other"):
+        resource = stage.split(":", 1)[0]
+        ticket = (priority, next(self._tickets))
+        started = time.monotonic()
+        with self._cond:
+            waiting = self._waiting.setdefault(resource, [])
+            heapq.heappush(waiting, ticket)
+            self._cond.notify_all()
+            while True:
+                if waiting[0] == ticket:
+                    delay = self._delay(resource, priority)
+                    if delay <= 0:
+                        heapq.heappop(waiting)
+                        budget = self._budgets.get(resource)
+                        if budget and budget["reset"] > time.time():
+                            # Count the request now; the response corrects the figure
+                            budget["remaining"] -= 1
+                        self._last_grant[resource] = time.time()
+                        self._cond.notify_all()
+                        break
+                    if delay > 5:
+                        print(f"GitHub {resource} budget low; waiting {delay:.0f}s for {stage}")
+                    self._cond.wait(delay)
+                else:
+                    self._cond.wait()
+        self.requests.acquire(1)
+        waited = time.monotonic() - started
+        with self._cond:
+            stats = self.stages.setdefault(stage, {"requests": 0, "waited": 0.0, "rate_limited": 0})
+            stats["requests"] += 1
+            stats["waited"] += waited
+        return waited
+
+    def observe(self, headers, status=None, stage=None):
+        """Update the budget from a response's rate-limit headers."""
+        remaining = header_value(headers, "x-ratelimit-remaining")
+        reset = header_value(headers, "x-ratelimit-reset")
+        limit = header_value(headers, "x-ratelimit-limit")
+        resource = header_value(headers, "x-ratelimit-resource") or (stage.split(":", 1)[0] if stage else "core")
+        retry_after = header_value(headers, "retry-after")
+        with self._cond:
+            if remaining is not None and reset is not None:
+                remaining, reset = int(remaining), float(reset)
+                budget = self._budgets.get(resource)
+                if budget is None or reset > budget["reset"]:
+                    self._budgets[resource] = {"limit": int(limit or remaining), "remaining": remaining, "reset": reset}
+                elif reset == budget["reset"]:
+                    # Responses can arrive out of order; the lowest figure is the latest
+                    budget["remaining"] = min(budget["remaining"], remaining)
+            if retry_after is not None:
+                try:
+                    self._paused_until = max(self._paused_until, time.time() + float(retry_after))
+                except ValueError:
+                    pass
+            if status in (403, 429) and stage:
+                stats = self.stages.setdefault(stage, {"requests": 0, "waited": 0.0, "rate_limited": 0})
+                stats["rate_limited"] += 1
+            self._cond.notify_all()
+
+    def summary(self):
+        """Per-stage request counts and waits, plus the budgets GitHub last reported."""
+        lines = ["GitHub budget by stage:"]
+        with self._cond:
+            for stage in sorted(self.stages):
+                stats = self.stages[stage]
+                line = f"- {stage}: {stats['requests']} requests, {stats['waited']:.1f}s waiting"
+                if stats["rate_limited"]:
+                    line += f", {stats['rate_limited']} rate limited"
+                lines.append(line)
+            for resource in sorted(self._budgets):
+                budget = self._budgets[resource]
+                reset = time.strftime("%H:%M:%S", time.localtime(budget["reset"]))
+                lines.append(f"- {resource} budget: {budget['remaining']} of {budget['limit']} left, resets at {reset}")
+        if len(lines) == 1:
+            lines.append("- no requests")
+        return "\n".join(lines)
+
+
+def is_rate_limited(status, headers):
+    """True for a GitHub 403/429 caused by a primary or secondary rate limit."""
+    if status not in (403, 429):
+        return False
+    return status == 429 or header_value(headers, "retry-after") is not None \
+        or header_value(headers, "x-ratelimit-remaining") == "0"
+
+
+def error_status(error):
+    """Return the HTTP status code carried by an API client exception, if any."""
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def is_retryable_error(error):
+    """
+    True for rate limiting (429, or a GitHub 403 rate limit), server errors
+    (5xx) and dropped connections/timeouts.
+    """
+    if getattr(error, "rate_limited", False):
+        return True
+    status = error_status(error)
+    if status is not None:
+        response = getattr(error, "response", None)
+        if status == 403 and response is not None:
+            return is_rate_limited(status, getattr(response, "headers", None) or {})
+        return status == 429 or status >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "ConnectionError", "Timeout")
+
+
+def retry_after_seconds(error):
+    """Read a Retry-After header from an API error response, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def call_with_backoff(func, max_retries=5, base_delay=1.0, max_delay=60.0, on_retry=None):
+    """
+    Call func(), retrying retryable errors with exponential backoff and full
+    jitter. A Retry-After header on the error overrides the computed delay.
+    """
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable_error(e):
+                raise
+            delay = retry_after_seconds(e)
+            if delay is None:
+                delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+            attempt += 1
+            if on_retry:
+                on_retry(e, attempt, delay)
+            time.sleep(delay)
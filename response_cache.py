@@ -0,0 +1,107 @@
+"""
+Persistent cache for LLM responses.
+
+Entries are keyed on a hash of the model name, the system message and the
+fully rendered prompt, so a response is reused only when the exact same
+request would be sent again. Entries live in a SQLite database and are
+evicted by age and total size.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_CACHE_PATH = os.path.join(".pr_analyses_cache", "llm_responses.sqlite")
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+
+
+def cache_key(model, system_message, prompt):
+    """Content hash identifying one chat completion request."""
+    payload = json.dumps([model, system_message, prompt], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    SQLite-backed response store shared by worker threads.
+
+    With refresh=True cached entries are never read but new responses are
+    still stored, which replaces stale entries.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 max_bytes=DEFAULT_MAX_BYTES, refresh=False):
+        self.path = path
+        self.max_age_seconds = max_age_days * 24 * 3600
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " model TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_used_at REAL NOT NULL)"
+        )
+        self._db.commit()
+        self.evict()
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss."""
+        with self._lock:
+            row = None
+            if not self.refresh:
+                row = self._db.execute(
+                    "SELECT content, created_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age_seconds:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_used_at = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key, model, content):
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, content, size, created_at, last_used_at)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, content, len(content.encode("utf-8")), now, now)
+            )
+            self._db.commit()
+
+    def evict(self):
+        """Drop entries older than the age limit, then least recently used entries until under the size limit."""
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._db.execute("SELECT key, size FROM responses ORDER BY last_used_at").fetchall()
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    total -= size
+            self._db.commit()
+
+    def close(self):
+        self.evict()
+        with self._lock:
+            self._db.close()
+
+    def summary(self):
+        return f"LLM response cache: {self.hits} hits, {self.misses} misses"
@@ -0,0 +1,135 @@
+"""
+Durable journal of the work done by a run.
+
+Every run gets an id and records, per repository and user, the stages it
+completes: each PR fetched, analyzed, failed or written, plus repository
+level milestones such as a finished scan. Records are committed as they
+happen, so a run that is killed can be resumed and skip work that already
+completed. Runs are matched on their configuration (repositories, users and
+date range) so --resume never continues a run with different inputs.
+"""
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import uuid
+
+DEFAULT_JOURNAL_PATH = os.path.join(".pr_analyses_cache", "run_journal.sqlite")
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class RunJournal:
+    """SQLite-backed run journal shared by worker threads."""
+
+    def __init__(self, path=DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self.run_id = None
+        self.resumed = False
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "PRAGMA journal_mode=WAL;"
+            "PRAGMA synchronous=NORMAL;"
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " run_id TEXT PRIMARY KEY,"
+            " config TEXT NOT NULL,"
+            " started_at TEXT NOT NULL,"
+            " finished_at TEXT);"
+            "CREATE TABLE IF NOT EXISTS events ("
+            " run_id TEXT NOT NULL,"
+            " repo TEXT NOT NULL,"
+            " user TEXT NOT NULL,"
+            " stage TEXT NOT NULL,"
+            " kind TEXT NOT NULL DEFAULT '',"
+            " number INTEGER NOT NULL DEFAULT 0,"
+            " detail TEXT,"
+            " recorded_at TEXT NOT NULL,"
+            " PRIMARY KEY (run_id, repo, user, stage, kind, number));"
+        )
+        self._db.commit()
+
+    def start_run(self, config, resume=False):
+        """
+        Start a run for config (a JSON-serializable dict). With resume, the
+        latest unfinished run with the same config is continued instead.
+        Returns the run id.
+        """
+        config_json = json.dumps(config, sort_keys=True, default=str)
+        with self._lock:
+            row = None
+            if resume:
+                row = self._db.execute(
+                    "SELECT run_id FROM runs WHERE config = ? AND finished_at IS NULL"
+                    " ORDER BY started_at DESC LIMIT 1",
+                    (config_json,)
+                ).fetchone()
+            if row:
+                self.run_id, self.resumed = row[0], True
+            else:
+                self.run_id, self.resumed = uuid.uuid4().hex[:12], False
+                self._db.execute(
+                    "INSERT INTO runs (run_id, config, started_at) VALUES (?, ?, ?)",
+                    (self.run_id, config_json, _now())
+                )
+                self._db.commit()
+        if resume and not self.resumed:
+            print("No unfinished run with the same repositories, authors and dates to resume; starting a new run.")
+        elif self.resumed:
+            print(f"Resuming run {self.run_id}")
+        return self.run_id
+
+    def record(self, repo, user, stage, kind="", number=0, detail=None):
+        """Record that a stage completed; recording it again replaces the earlier record."""
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO events (run_id, repo, user, stage, kind, number, detail, recorded_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.run_id, repo, user, stage, kind, number, detail, _now())
+            )
+            self._db.commit()
+
+    def forget(self, repo, user, stage, kind="", number=0):
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM events WHERE run_id = ? AND repo = ? AND user = ? AND stage = ? AND kind = ? AND number = ?",
+                (self.run_id, repo, user, stage, kind, number)
+            )
+            self._db.commit()
+
+    def get(self, repo, user, stage, kind="", number=0):
+        """Return the detail of a recorded stage ('' when it has none), or None if it was not recorded."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT detail FROM events WHERE run_id = ? AND repo = ? AND user = ? AND stage = ? AND kind = ? AND number = ?",
+                (self.run_id, repo, user, stage, kind, number)
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0] or ""
+
+    def has(self, repo, user, stage, kind="", number=0):
+        return self.get(repo, user, stage, kind, number) is not None
+
+    def count(self, repo, user, stage):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM events WHERE run_id = ? AND repo = ? AND user = ? AND stage = ?",
+                (self.run_id, repo, user, stage)
+            ).fetchone()[0]
+
+    def finish_run(self):
+        """Mark the run finished so --resume no longer picks it up."""
+        with self._lock:
+            self._db.execute("UPDATE runs SET finished_at = ? WHERE run_id = ?", (_now(), self.run_id))
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            self._db.close()